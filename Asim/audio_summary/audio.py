@@ -1,28 +1,23 @@
 from flask import Flask, jsonify, request
 import json
 import speech_recognition as sr
-from pydub import AudioSegment
 from pathlib import Path
 import os
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 import numpy as np
 from datetime import datetime
 from collections import Counter
-from textblob import TextBlob
-import spacy
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import CountVectorizer
 import re
-from keybert import KeyBERT
 import logging
 from werkzeug.serving import WSGIRequestHandler
 from dotenv import load_dotenv
 import time
 import contextlib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import wave
 from flask.json.provider import DefaultJSONProvider
 
@@ -33,6 +28,17 @@ from composio_langchain import ComposioToolSet
 import os
 from datetime import datetime
 from flask_cors import CORS
+import sys
+
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.llm_client import LLM_BACKEND, get_llm_client
+from common.llm_metrics import instrument_flask_app, submit_with_context, track_call
+from blob_store import BlobStore
+from jobs import JobQueue
+from model_registry import WARMUP_MODELS, registry
+from sentiment import analyze_transcript_sentiment
+from transcription import TRANSCRIBE_BACKEND, TranscriptionError, probe_audio_tools, transcribe_file
 
 # Load environment variables
 load_dotenv()
@@ -71,6 +77,7 @@ class CustomJSONProvider(DefaultJSONProvider):
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'meeting_analysis')
 app.json = CustomJSONProvider(app)
 app.config['TIMEOUT'] = 600  # 10 minutes in seconds
 
@@ -80,44 +87,87 @@ db = client['SPIT_HACK']
 meets_collection = db['meet_details']
 print(meets_collection)
 analysis_collection = db['meet_analysis']
+participants_collection = db['meeting_participants']
 
-# Initialize models and tools
-nlp = spacy.load('en_core_web_sm')
-sentiment_analyzer = pipeline("sentiment-analysis", model="nlptown/bert-base-multilingual-uncased-sentiment")
-emotion_analyzer = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
-key_phrase_model = KeyBERT()
-vader_analyzer = SentimentIntensityAnalyzer()
+# Bump when prompts or analysis output change so stored analyses are redone
+ANALYSIS_VERSION = 1
 
-# Initialize Gemini API
+# Analysis fields that can grow with meeting length; stored as blobs when large
+LARGE_FIELDS = ['transcript', 'summary', 'minutes.formatted_minutes', 'sentiment_analysis.detailed_analysis']
+blob_store = BlobStore(db)
+
+def ensure_indexes():
+    """One analysis and one participant record per meeting, found by index"""
+    meets_collection.create_index('meet_id')
+    for collection in (analysis_collection, participants_collection):
+        try:
+            collection.create_index('meet_id', unique=True)
+        except OperationFailure as e:
+            logger.error(f"Could not create unique meet_id index on {collection.name}; "
+                         f"remove duplicate documents first: {str(e)}")
+
+ensure_indexes()
+
+def transcript_hash(transcript):
+    """Hash of the whitespace-normalized transcript, identifying what an analysis was made from"""
+    return hashlib.sha256(' '.join(transcript.split()).encode('utf-8')).hexdigest()
+
+def find_current_analysis(meet_id, digest):
+    """The stored complete analysis of this exact transcript, or None"""
+    return analysis_collection.find_one(
+        {
+            'meet_id': meet_id,
+            'transcript_hash': digest,
+            'analysis_version': ANALYSIS_VERSION,
+            'analysis_status': 'complete'
+        },
+        {'_id': 1, 'analysis_status': 1, 'timestamp': 1}
+    )
+
+# NLP models load on first use through the registry (WARMUP_MODELS loads some at startup)
+
+# Initialize Gemini API (LLM_BACKEND=stub runs without network)
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and LLM_BACKEND == 'gemini':
     logger.error("GOOGLE_API_KEY not found in environment variables")
     raise ValueError("GOOGLE_API_KEY is required. Please set it in your .env file")
 
+# Per-stage limits for a meeting analysis job, in seconds
+LLM_STAGE_TIMEOUT = int(os.getenv('LLM_STAGE_TIMEOUT', '180'))
+SENTIMENT_TIMEOUT = int(os.getenv('SENTIMENT_TIMEOUT', '120'))
+
+# Transcripts longer than this are summarized chunk by chunk before the final prompts
+TRANSCRIPT_DIRECT_CHARS = int(os.getenv('TRANSCRIPT_DIRECT_CHARS', '60000'))
+TRANSCRIPT_CHUNK_CHARS = int(os.getenv('TRANSCRIPT_CHUNK_CHARS', '12000'))
+TRANSCRIPT_CHUNK_OVERLAP = int(os.getenv('TRANSCRIPT_CHUNK_OVERLAP', '400'))
+MAX_SUMMARY_LEVELS = 3
+chunk_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CHUNK_SUMMARY_WORKERS', '4')),
+    thread_name_prefix='transcript-chunk'
+)
+
 try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    llm = GoogleGenerativeAI(model="gemini-pro", google_api_key=GOOGLE_API_KEY)
-    logger.info("Successfully configured Gemini API")
+    llm = get_llm_client("gemini-pro", GOOGLE_API_KEY)
+    logger.info(f"Successfully configured {LLM_BACKEND} LLM backend")
 except Exception as e:
-    logger.error(f"Failed to configure Gemini API: {str(e)}")
+    logger.error(f"Failed to configure LLM backend: {str(e)}")
     raise
 
 
 import os
 import speech_recognition as sr
-from pydub import AudioSegment
 from pathlib import Path
-import subprocess
 import logging
 from datetime import datetime
 
 def check_ffmpeg():
-    """Check if FFmpeg is installed and accessible"""
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        logger.info("✓ FFmpeg is installed and accessible")
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
+    """Probe FFmpeg and the transcription backend once at startup and log what is missing"""
+    tools = probe_audio_tools()
+    if not tools['backends'].get(TRANSCRIBE_BACKEND, False):
+        logger.error(f"✗ Transcription backend '{TRANSCRIBE_BACKEND}' is not available")
+    if tools['ffmpeg']['available']:
+        logger.info(f"✓ FFmpeg is installed and accessible ({tools['ffmpeg']['version']})")
+    else:
         logger.error("✗ FFmpeg is not installed or not accessible")
         logger.info("\nPlease install FFmpeg using one of these methods:")
         logger.info("1. Using Chocolatey (recommended):")
@@ -126,106 +176,139 @@ def check_ffmpeg():
         logger.info("   a. Download from: https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-full.7z")
         logger.info("   b. Extract to C:\\ffmpeg")
         logger.info("   c. Add C:\\ffmpeg\\bin to your system PATH")
-        return False
+    return tools['ready']
 
-def convert_mp3_to_wav(mp3_path):
-    """Convert MP3 file to WAV format"""
-    try:
-        wav_path = mp3_path.with_suffix('.wav')
-        logger.info(f"Converting: {mp3_path}")
-        logger.info(f"Output to: {wav_path}")
-        
-        audio = AudioSegment.from_mp3(str(mp3_path))
-        audio.export(str(wav_path), format="wav")
-        logger.info("✓ Conversion successful")
-        return wav_path
-    except Exception as e:
-        logger.error(f"Error during conversion: {str(e)}")
-        raise
+# Probed once; transcription requests reuse the cached result
+check_ffmpeg()
 
 def transcribe_audio(audio_path):
     """
-    Transcribe audio file to text using Google Speech Recognition.
+    Transcribe audio file to text in silence-separated segments.
     
     Args:
         audio_path (str): Path to the audio file
         
     Returns:
-        str: Transcribed text or None if transcription fails
+        dict: text and timestamped segments, or None if transcription fails
     """
     try:
         logger.info(f"Starting transcription for: {audio_path}")
         
-        # Check FFmpeg installation first
-        if not check_ffmpeg():
-            logger.error("FFmpeg check failed - cannot proceed with transcription")
-            return None
-
-        # Initialize recognizer with increased timeout
-        recognizer = sr.Recognizer()
-        recognizer.operation_timeout = 600  # 10 minutes timeout
-        
         # Convert path to Path object
         audio_file = Path(audio_path)
         if not audio_file.exists():
             logger.error(f"Audio file not found: {audio_path}")
             return None
-            
-        # Handle MP3 files by converting to WAV first
-        if audio_file.suffix.lower() == '.mp3':
-            try:
-                wav_file = convert_mp3_to_wav(audio_file)
-                audio_file = wav_file
-            except Exception as e:
-                logger.error(f"Error converting MP3 to WAV: {str(e)}")
-                return None
-        
-        # Read and transcribe the audio file
+        
+        # ffmpeg decodes straight into the transcriber, so no WAV copy is written
         logger.info("Starting transcription...")
         start_time = datetime.now()
+        result = transcribe_file(audio_file)
+        text = result['text']
+        
+        # Calculate transcription time
+        duration = datetime.now() - start_time
+        logger.info(
+            f"Transcription completed in {duration.total_seconds():.2f} seconds "
+            f"({len(result['segments'])} segments, {result['failed_segments']} failed)"
+        )
         
-        with sr.AudioFile(str(audio_file)) as source:
-            logger.info("Reading audio file...")
-            audio_data = recognizer.record(source)
-            
-            logger.info("Sending to Google Speech Recognition...")
-            text = recognizer.recognize_google(audio_data)
-            
-            # Calculate transcription time
-            duration = datetime.now() - start_time
-            logger.info(f"Transcription completed in {duration.total_seconds():.2f} seconds")
-            
-            # Save transcription to a text file with same name as audio file
-            output_file = audio_file.with_suffix('.txt')
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(text)
-            
-            logger.info(f"Transcription saved to: {output_file}")
-            logger.info("Preview:")
-            logger.info(f"{text[:200]}..." if len(text) > 200 else text)
-        
-        # Clean up temporary WAV file if it was converted from MP3
-        if audio_file.suffix.lower() == '.wav' and audio_file != Path(audio_path):
-            audio_file.unlink()
-            logger.info("Temporary WAV file cleaned up")
+        # Save transcription to a text file with same name as audio file
+        output_file = audio_file.with_suffix('.txt')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        
+        logger.info(f"Transcription saved to: {output_file}")
+        logger.info("Preview:")
+        logger.info(f"{text[:200]}..." if len(text) > 200 else text)
             
-        return text
+        return result
         
-    except sr.RequestError as e:
-        logger.error(f"Google Speech Recognition request failed: {e}")
-        return None
-    except sr.UnknownValueError:
-        logger.error(f"Could not understand audio in file: {audio_path}")
+    except TranscriptionError as e:
+        logger.error(f"Transcription failed for {audio_path}: {e}")
         return None
     except Exception as e:
         logger.error(f"Error processing {audio_path}: {e}", exc_info=True)
         return None
 
-def generate_meeting_summary(transcript):
-    """Generate meeting summary using Gemini"""
+def summarize_transcript_chunks(text, level=1):
+    """
+    Map step for long transcripts: split on natural boundaries and take notes on
+    every chunk concurrently. Notes that are still too long are condensed again.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=TRANSCRIPT_CHUNK_CHARS,
+        chunk_overlap=TRANSCRIPT_CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    chunks = splitter.split_text(text)
+    logger.info(f"Summarizing {len(chunks)} transcript chunks (level {level})")
+
+    def chunk_notes(index, chunk):
+        notes_prompt = f"""
+        You are taking notes on part {index + 1} of {len(chunks)} of a meeting transcript.
+        Write concise notes covering only this part:
+        
+        - Topics discussed
+        - Key points, including any names, numbers and dates mentioned
+        - Action items with the owner and deadline if stated
+        - Decisions made
+        - Open questions and next steps
+        
+        Transcript part: {chunk}
+        """
+        return llm.generate(notes_prompt, timeout=LLM_STAGE_TIMEOUT)
+
+    futures = [
+        submit_with_context(chunk_executor, chunk_notes, index, chunk)
+        for index, chunk in enumerate(chunks)
+    ]
+    notes = "\n\n".join(
+        f"Part {index + 1}:\n{future.result()}" for index, future in enumerate(futures)
+    )
+    if len(notes) > TRANSCRIPT_DIRECT_CHARS and len(chunks) > 1 and level < MAX_SUMMARY_LEVELS:
+        return summarize_transcript_chunks(notes, level + 1)
+    return notes
+
+class TranscriptDigest:
+    """
+    Prompt input for a transcript. Short transcripts are used as they are; long ones
+    are summarized chunk by chunk once and the notes are shared by the summary and
+    the minutes.
+    """
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.chunked = len(transcript) > TRANSCRIPT_DIRECT_CHARS
+        self.notes = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def prompt_input(self):
+        """
+        Returns:
+            tuple: (label, text) to place in a prompt
+        """
+        if not self.chunked:
+            return 'Transcript', self.transcript
+        # Whichever stage gets here first does the map step; the other waits for it.
+        # A failed map step is not retried: the other stage gets the same error.
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            if self.notes is None:
+                try:
+                    self.notes = summarize_transcript_chunks(self.transcript)
+                except Exception as e:
+                    self.error = e
+                    raise
+        return 'Notes taken from consecutive parts of the transcript', self.notes
+
+def generate_meeting_summary(digest):
+    """Generate meeting summary using Gemini from a TranscriptDigest"""
     try:
+        label, content = digest.prompt_input()
         summary_prompt = f"""
-        Based on this meeting transcript, provide a structured analysis in the following format:
+        Based on this meeting {label.lower()}, provide a structured analysis in the following format:
         
         1. Executive Summary (2-3 paragraphs)
         2. Key Points Discussed (bullet points)
@@ -236,18 +319,20 @@ def generate_meeting_summary(transcript):
         4. Decisions Made
         5. Next Steps
         
-        Transcript: {transcript}
+        {label}: {content}
         """
         
-        summary = llm.invoke(summary_prompt)
+        summary = llm.generate(summary_prompt, timeout=LLM_STAGE_TIMEOUT)
         return summary
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         raise
 
-def generate_meeting_minutes(transcript, meeting_details):
-    """Generate formal meeting minutes using Gemini with meeting details"""
+def generate_meeting_minutes(digest, meeting_details):
+    """Generate formal meeting minutes using Gemini with meeting details and a TranscriptDigest"""
     try:
+        label, content = digest.prompt_input()
+
         # Format meeting details
         start_time = datetime.strptime(meeting_details.get('start_time', ''), "%Y-%m-%dT%H:%M:%SZ")
         end_time = datetime.strptime(meeting_details.get('end_time', ''), "%Y-%m-%dT%H:%M:%SZ")
@@ -278,11 +363,11 @@ def generate_meeting_minutes(transcript, meeting_details):
         5. Next Steps
         6. Next Meeting (if mentioned)
         
-        Use this transcript to generate the minutes:
-        {transcript}
+        Use this {label.lower()} to generate the minutes:
+        {content}
         """
         
-        minutes = llm.invoke(minutes_prompt)
+        minutes = llm.generate(minutes_prompt, timeout=LLM_STAGE_TIMEOUT)
         return {
             'formatted_minutes': minutes,
             'metadata': {
@@ -298,68 +383,83 @@ def generate_meeting_minutes(transcript, meeting_details):
         logger.error(f"Error generating minutes: {str(e)}")
         raise
 
-def analyze_sentiment(transcript):
-    """Perform sentiment analysis on the transcript"""
+def analyze_sentiment(transcript, segments=None):
+    """Perform sentence-level sentiment analysis on the transcript, using timestamped segments when available"""
     try:
-        # Overall sentiment analysis
-        overall_sentiment = vader_analyzer.polarity_scores(transcript)
-        
-        # Break transcript into segments for detailed analysis
-        segments = [s.strip() for s in transcript.split('.') if s.strip()]
-        segment_analysis = []
-        
-        for segment in segments:
-            scores = vader_analyzer.polarity_scores(segment)
-            segment_analysis.append({
-                'text': segment,
-                'sentiment': scores
-            })
-        
-        return {
-            'overall_sentiment': overall_sentiment,
-            'detailed_analysis': segment_analysis,
-            'summary': {
-                'positive_segments': len([s for s in segment_analysis if s['sentiment']['compound'] > 0.05]),
-                'negative_segments': len([s for s in segment_analysis if s['sentiment']['compound'] < -0.05]),
-                'neutral_segments': len([s for s in segment_analysis if abs(s['sentiment']['compound']) <= 0.05])
-            }
-        }
+        return analyze_transcript_sentiment(transcript, segments)
     except Exception as e:
         logger.error(f"Error in sentiment analysis: {str(e)}")
         raise
 
-@app.route('/analyze/<meet_id>', methods=['POST'])
-def analyze_meeting(meet_id):
-    try:
-        logger.info(f"Starting analysis for meet_id: {meet_id}")
-        
-        # Get meeting details from database
-        meeting = meets_collection.find_one({'meet_id': meet_id})
-        if not meeting:
-            return jsonify({'error': 'Meeting not found'}), 404
-        
-        # Handle transcription if needed
-        transcript = meeting.get('transcript')
-        if not transcript:
+def run_analysis_job(job):
+    """Transcribe (if needed), analyze and store one meeting, reporting each stage on the job"""
+    meet_id = job.meet_id
+    logger.info(f"Starting analysis for meet_id: {meet_id}")
+    
+    # Get meeting details from database
+    meeting = meets_collection.find_one({'meet_id': meet_id})
+    if not meeting:
+        raise ValueError('Meeting not found')
+    
+    # Handle transcription if needed
+    transcript = meeting.get('transcript')
+    segments = meeting.get('transcript_segments')
+    if transcript:
+        job.skip('transcription', 'Transcript already stored')
+    else:
+        with job.stage('transcription'):
             logger.info(f"No transcript found, attempting transcription for meet_id: {meet_id}")
             audio_path = meeting.get('audio_path')
-            
             if not audio_path:
-                return jsonify({'error': 'No audio path found'}), 400
+                raise ValueError('No audio path found')
                 
-            transcript = transcribe_audio(audio_path)
-            if not transcript:
-                return jsonify({'error': 'Transcription failed'}), 500
+            transcription = transcribe_audio(audio_path)
+            if not transcription or not transcription['text']:
+                raise TranscriptionError('Transcription failed')
+            transcript = transcription['text']
+            segments = transcription['segments']
                 
             # Update meeting document with transcript
             meets_collection.update_one(
                 {'meet_id': meet_id},
-                {'$set': {'transcript': transcript}}
+                {'$set': {
+                    'transcript': transcript,
+                    'transcript_segments': transcription['segments']
+                }}
             )
             logger.info(f"Transcription completed and saved for meet_id: {meet_id}")
-        
-        # Store participants in separate collection
-        participants_collection = db['meeting_participants']
+    
+    # Nothing to redo when this transcript was already fully analyzed
+    content_hash = transcript_hash(transcript)
+    existing = None if job.options.get('force') else find_current_analysis(meet_id, content_hash)
+    if existing:
+        for name in ('summary', 'minutes', 'sentiment', 'store'):
+            job.skip(name, 'Transcript unchanged since the last analysis')
+        logger.info(f"Analysis for meet_id {meet_id} is up to date, skipping")
+        return {
+            'analysis_status': existing['analysis_status'],
+            'cached': True,
+            'analyzed_at': existing['timestamp'],
+            'transcript_preview': transcript[:200] + '...' if len(transcript) > 200 else transcript,
+            'participant_count': len(meeting.get('participants', [])),
+            'duration_minutes': meeting.get('duration_minutes', 0)
+        }
+    
+    # Independent stages run side by side; whatever finishes in time is kept.
+    # Long transcripts are condensed once and shared by the summary and the minutes.
+    digest = TranscriptDigest(transcript)
+    # The map step is one more round of concurrent LLM calls ahead of the final prompt
+    llm_timeout = LLM_STAGE_TIMEOUT * (2 if digest.chunked else 1)
+    results, errors = job.run_stages({
+        'summary': (lambda: generate_meeting_summary(digest), llm_timeout),
+        'minutes': (lambda: generate_meeting_minutes(digest, meeting), llm_timeout),
+        'sentiment': (lambda: analyze_sentiment(transcript, segments), SENTIMENT_TIMEOUT)
+    }, stage_executor)
+    if not results:
+        raise RuntimeError(f"All analysis stages failed: {errors}")
+    
+    with job.stage('store'):
+        # Store participants in separate collection, one record per meeting
         participant_doc = {
             'meet_id': meet_id,
             'timestamp': datetime.utcnow(),
@@ -367,17 +467,15 @@ def analyze_meeting(meet_id):
             'total_participants': len(meeting.get('participants', [])),
             'duration_minutes': meeting.get('duration_minutes', 0)
         }
-        participants_collection.insert_one(participant_doc)
-        
-        # Generate analysis with complete meeting details
-        summary = generate_meeting_summary(transcript)
-        minutes = generate_meeting_minutes(transcript, meeting)
-        sentiment = analyze_sentiment(transcript)
+        participants_collection.replace_one({'meet_id': meet_id}, participant_doc, upsert=True)
         
         # Create comprehensive analysis document
         analysis = {
             'meet_id': meet_id,
+            'job_id': job.id,
             'timestamp': datetime.utcnow(),
+            'transcript_hash': content_hash,
+            'analysis_version': ANALYSIS_VERSION,
             'meeting_details': {
                 'start_time': meeting.get('start_time'),
                 'end_time': meeting.get('end_time'),
@@ -387,35 +485,121 @@ def analyze_meeting(meet_id):
                 'participant_count': len(meeting.get('participants', []))
             },
             'transcript': transcript,
-            'summary': summary,
-            'minutes': minutes,
-            'sentiment_analysis': sentiment,
-            'participants': participant_doc
+            'summary': results.get('summary'),
+            'minutes': results.get('minutes'),
+            'sentiment_analysis': results.get('sentiment'),
+            'participants': participant_doc,
+            'analysis_status': 'partial' if errors else 'complete',
+            'analysis_errors': errors
         }
+        # Replaces the previous analysis of the meeting, including any sharing status
+        previous = analysis_collection.find_one({'meet_id': meet_id}, {'blob_refs': 1})
+        blob_store.externalize(analysis, LARGE_FIELDS, meet_id)
+        analysis_collection.replace_one({'meet_id': meet_id}, analysis, upsert=True)
+        if previous:
+            blob_store.delete(previous.get('blob_refs'))
+    logger.info(f"Analysis {analysis['analysis_status']} and stored for meet_id: {meet_id}")
+    
+    return {
+        'analysis_status': analysis['analysis_status'],
+        'cached': False,
+        'failed_stages': sorted(errors),
+        'transcript_preview': transcript[:200] + '...' if len(transcript) > 200 else transcript,
+        'participant_count': len(meeting.get('participants', [])),
+        'duration_minutes': meeting.get('duration_minutes', 0)
+    }
+
+# Analysis runs in background workers; set JOB_WORKERS=0 to only enqueue here and run worker.py instead
+ANALYSIS_STAGES = ['transcription', 'summary', 'minutes', 'sentiment', 'store']
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+stage_executor = ThreadPoolExecutor(max_workers=max(JOB_WORKERS, 1) * 3, thread_name_prefix='analysis-stage')
+job_queue = JobQueue(db['analysis_jobs'], run_analysis_job, ANALYSIS_STAGES)
+# Under gunicorn and worker.py; the development server starts them below
+if __name__ != '__main__':
+    job_queue.start(JOB_WORKERS)
+
+@app.route('/analyze/<meet_id>', methods=['POST'])
+def analyze_meeting(meet_id):
+    try:
+        meeting = meets_collection.find_one({'meet_id': meet_id}, {'transcript': 1, 'audio_path': 1})
+        if not meeting:
+            return jsonify({'error': 'Meeting not found'}), 404
         
-        # Store analysis
-        analysis_collection.insert_one(analysis)
-        logger.info(f"Analysis completed and stored for meet_id: {meet_id}")
-        
+        force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+        transcript = meeting.get('transcript')
+        if not transcript:
+            if not meeting.get('audio_path'):
+                return jsonify({'error': 'No audio path found'}), 400
+            if not probe_audio_tools()['ready']:
+                return jsonify({'error': 'Transcription unavailable: FFmpeg or the recognizer backend is missing'}), 503
+        elif not force:
+            existing = find_current_analysis(meet_id, transcript_hash(transcript))
+            if existing:
+                return jsonify({
+                    'message': 'Analysis is up to date',
+                    'meet_id': meet_id,
+                    'cached': True,
+                    'analyzed_at': existing['timestamp']
+                })
+        
+        job_id, created = job_queue.enqueue(meet_id, {'force': force})
+        logger.info(f"{'Queued' if created else 'Already running'} analysis job {job_id} for meet_id: {meet_id}")
         return jsonify({
-            'message': 'Analysis completed successfully',
+            'message': 'Analysis queued' if created else 'Analysis already in progress',
             'meet_id': meet_id,
-            'transcript_preview': transcript[:200] + '...' if len(transcript) > 200 else transcript,
-            'participant_count': len(meeting.get('participants', [])),
-            'duration_minutes': meeting.get('duration_minutes', 0)
-        })
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}'
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error analyzing meeting {meet_id}: {str(e)}")
+        logger.error(f"Error queueing analysis for meeting {meet_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    tools = probe_audio_tools()
+    return jsonify({
+        'status': 'healthy' if tools['ready'] else 'degraded',
+        'timestamp': datetime.now().isoformat(),
+        'audio_tools': tools
+    })
+
+@app.route('/model_stats', methods=['GET'])
+def model_stats():
+    return jsonify(registry.get_stats())
+
 @app.route('/getAnalysis/<meet_id>', methods=['GET'])
 def get_analysis(meet_id):
+    """
+    Return the stored analysis. ?fields=meeting_details,summary,sentiment_analysis.overall_sentiment
+    limits the response to those (dotted) fields, and only their blobs are loaded.
+    """
     try:
-        analysis = analysis_collection.find_one({'meet_id': meet_id})
+        selected = None
+        projection = None
+        if request.args.get('fields'):
+            paths = sorted({path.strip() for path in request.args['fields'].split(',') if path.strip()})
+            # MongoDB rejects a projection holding both a field and one of its subfields
+            selected = [path for path in paths if not any(path.startswith(other + '.') for other in paths)]
+            projection = dict.fromkeys(selected + ['meet_id', 'blob_refs'], 1)
+        
+        analysis = analysis_collection.find_one({'meet_id': meet_id}, projection)
         if not analysis:
             return jsonify({'error': 'Analysis not found'}), 404
             
+        blob_store.resolve(analysis, selected)
         analysis['_id'] = str(analysis['_id'])
         return jsonify(analysis)
         
@@ -452,6 +636,7 @@ def format_analysis_for_doc(analysis):
     """Format meeting analysis into a structured document"""
     meeting_date = datetime.strptime(analysis['meeting_details']['start_time'], 
                                    "%Y-%m-%dT%H:%M:%SZ").strftime("%B %d, %Y")
+    minutes = analysis.get('minutes')
     
     doc_content = f"""# Meeting Analysis Report
 Date: {meeting_date}
@@ -463,19 +648,26 @@ Title: {analysis['meeting_details']['title']}
 - Participants: {analysis['meeting_details']['participant_count']}
 
 ## Executive Summary
-{analysis['summary']}
+{analysis.get('summary') or 'Not available'}
 
 ## Meeting Minutes
-{analysis['minutes']['formatted_minutes']}
+{minutes['formatted_minutes'] if minutes else 'Not available'}
 
 ## Sentiment Analysis
-Overall Sentiment: {analysis['sentiment_analysis']['overall_sentiment']}
+"""
+    # Partial analyses may be missing any of the generated sections
+    sentiment = analysis.get('sentiment_analysis')
+    if sentiment:
+        doc_content += f"""Overall Sentiment: {sentiment['overall_sentiment']}
 
 ### Sentiment Summary
-- Positive Segments: {analysis['sentiment_analysis']['summary']['positive_segments']}
-- Negative Segments: {analysis['sentiment_analysis']['summary']['negative_segments']}
-- Neutral Segments: {analysis['sentiment_analysis']['summary']['neutral_segments']}
-
+- Positive Segments: {sentiment['summary']['positive_segments']}
+- Negative Segments: {sentiment['summary']['negative_segments']}
+- Neutral Segments: {sentiment['summary']['neutral_segments']}
+"""
+    else:
+        doc_content += "Not available\n"
+    doc_content += """
 send the document link to participants as well
 
 """
@@ -487,9 +679,12 @@ def share_analysis(meet_id):
         logger.info(f"Starting share process for meet_id: {meet_id}")
         
         # Check if analysis exists
-        analysis = analysis_collection.find_one({'meet_id': meet_id})
+        analysis = analysis_collection.find_one(
+            {'meet_id': meet_id}, {'transcript': 0, 'sentiment_analysis.detailed_analysis': 0}
+        )
         if not analysis:
             return jsonify({'error': 'Analysis not found for this meeting'}), 404
+        blob_store.resolve(analysis, ['summary', 'minutes', 'sentiment_analysis.overall_sentiment', 'sentiment_analysis.summary'])
             
         # Get participant emails from meeting details
         participants = analysis['participants']['participants']
@@ -512,7 +707,9 @@ def share_analysis(meet_id):
         Title the document: "Meeting Analysis - {analysis['meeting_details']['title']} - {meet_id}"
         """
         
-        doc_result = executor.invoke({"input": create_doc_prompt})
+        with track_call('agent', 'openai', 'composio-agent', create_doc_prompt) as call:
+            doc_result = executor.invoke({"input": create_doc_prompt})
+            call.set_response(doc_result.get('output', ''))
         
         # Extract document ID and URL from result
         doc_id = doc_result['output']  # Adjust based on actual response structure
@@ -540,7 +737,9 @@ def share_analysis(meet_id):
             Meeting Analysis Team
             """
             
-            executor.invoke({"input": email_prompt})
+            with track_call('agent', 'openai', 'composio-agent', email_prompt) as call:
+                email_result = executor.invoke({"input": email_prompt})
+                call.set_response(email_result.get('output', ''))
         
         # Update meeting document with sharing status
         analysis_collection.update_one(
@@ -571,4 +770,9 @@ def share_analysis(meet_id):
 
 if __name__ == '__main__':
     logger.info("Starting Meeting Analysis Server...")
+    # The reloader runs this script twice: a watcher that never serves and the serving child
+    # (WERKZEUG_RUN_MAIN). Only the child, which is replaced on every code change, runs jobs.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        registry.warmup(WARMUP_MODELS)
+        job_queue.start(JOB_WORKERS)
     app.run(debug=True, port=5050, host='0.0.0.0')
\ No newline at end of file
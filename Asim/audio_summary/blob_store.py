@@ -0,0 +1,94 @@
+"""
+Large analysis fields kept out of the analysis documents.
+
+Fields whose JSON encoding exceeds INLINE_FIELD_BYTES are gzip-compressed into
+GridFS and replaced by None in the document, with a reference in its blob_refs
+list. Readers load only the blobs for the fields they ask for, so metadata reads
+stay small and long meetings stay well under MongoDB's 16 MB document limit.
+"""
+import gzip
+import json
+import logging
+import os
+
+import gridfs
+
+logger = logging.getLogger(__name__)
+
+INLINE_FIELD_BYTES = int(os.getenv('INLINE_FIELD_BYTES', '16384'))
+
+
+def get_path(doc, path):
+    for key in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def set_path(doc, path, value):
+    keys = path.split('.')
+    for key in keys[:-1]:
+        if not isinstance(doc.get(key), dict):
+            doc[key] = {}
+        doc = doc[key]
+    doc[keys[-1]] = value
+
+
+def field_selected(field, selected):
+    """Whether a stored field is needed for a selection of dotted field paths (None selects all)"""
+    if selected is None:
+        return True
+    return any(
+        field == path or field.startswith(path + '.') or path.startswith(field + '.')
+        for path in selected
+    )
+
+
+class BlobStore:
+    """Compressed JSON blobs in a GridFS bucket, referenced from analysis documents"""
+    def __init__(self, db, bucket='analysis_blobs', inline_limit=INLINE_FIELD_BYTES):
+        self.fs = gridfs.GridFS(db, collection=bucket)
+        self.inline_limit = inline_limit
+
+    def put(self, value, **metadata):
+        data = gzip.compress(json.dumps(value, default=str).encode('utf-8'))
+        return self.fs.put(data, metadata=metadata), len(data)
+
+    def get(self, file_id):
+        return json.loads(gzip.decompress(self.fs.get(file_id).read()))
+
+    def externalize(self, doc, fields, owner):
+        """
+        Move the large ones among the given dotted fields of doc into blobs, in place.
+
+        Returns:
+            dict: the document, with blob_refs listing field, file_id and sizes
+        """
+        refs = []
+        for field in fields:
+            value = get_path(doc, field)
+            if value is None:
+                continue
+            size = len(json.dumps(value, default=str).encode('utf-8'))
+            if size <= self.inline_limit:
+                continue
+            file_id, stored_size = self.put(value, owner=owner, field=field)
+            set_path(doc, field, None)
+            refs.append({'field': field, 'file_id': file_id, 'size': size, 'stored_size': stored_size})
+        doc['blob_refs'] = refs
+        return doc
+
+    def resolve(self, doc, selected=None):
+        """Load the blobs of the selected fields (all when None) back into doc, in place"""
+        for ref in doc.pop('blob_refs', None) or []:
+            if field_selected(ref['field'], selected):
+                set_path(doc, ref['field'], self.get(ref['file_id']))
+        return doc
+
+    def delete(self, refs):
+        for ref in refs or []:
+            try:
+                self.fs.delete(ref['file_id'])
+            except Exception as e:
+                logger.warning(f"Could not delete blob {ref['file_id']} for {ref['field']}: {str(e)}")
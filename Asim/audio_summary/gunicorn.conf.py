@@ -0,0 +1,27 @@
+# Production server for the meeting analysis service:
+#   gunicorn -c gunicorn.conf.py audio:app
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5050)}"
+
+# Requests only enqueue jobs or read MongoDB; the heavy lifting happens in job worker threads
+workers = int(os.getenv('WEB_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# The app is not preloaded: it opens MongoDB connections and starts job threads,
+# neither of which survive a fork. Only the models are loaded in the master.
+preload_app = False
+
+
+def on_starting(server):
+    from model_registry import WARMUP_MODELS, registry
+    registry.warmup(WARMUP_MODELS)
+    # Keep the loaded objects out of the collector so workers do not touch (and copy) their pages
+    gc.freeze()
+
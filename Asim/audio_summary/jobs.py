@@ -0,0 +1,265 @@
+"""
+Background jobs for meeting analysis.
+
+Jobs live in a MongoDB collection so any process can enqueue, run or report on
+them. The web process enqueues and answers with a job id straight away; worker
+threads, in the web process or in separate worker.py processes, claim queued
+jobs atomically and record the progress of every stage on the job document.
+A running job refreshes its heartbeat, so jobs left behind by a dead worker are
+picked up again once they go stale.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from common.llm_metrics import submit_with_context
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '5'))
+JOB_HEARTBEAT_SECONDS = int(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '300'))
+MAX_JOB_ATTEMPTS = int(os.getenv('MAX_JOB_ATTEMPTS', '3'))
+# How long a stage may wait for a free stage thread before it is given up
+STAGE_QUEUE_TIMEOUT = int(os.getenv('STAGE_QUEUE_TIMEOUT', '300'))
+
+# Attempts at enqueueing when the active job finishes while we look it up
+ENQUEUE_RETRIES = 3
+
+
+class Job:
+    """Handle passed to the job handler for reporting stage progress"""
+    def __init__(self, queue, doc):
+        self.queue = queue
+        self.id = doc['_id']
+        self.meet_id = doc['meet_id']
+        self.options = doc.get('options') or {}
+
+    def update(self, fields):
+        fields['updated_at'] = datetime.utcnow()
+        self.queue.collection.update_one({'_id': self.id}, {'$set': fields})
+
+    def mark(self, name, status, **details):
+        fields = {f'stages.{name}.status': status}
+        fields.update({f'stages.{name}.{key}': value for key, value in details.items()})
+        self.update(fields)
+
+    @contextmanager
+    def stage(self, name):
+        """Mark a stage running, then done or failed with its duration and error"""
+        start = time.perf_counter()
+        self.mark(name, 'running', started_at=datetime.utcnow())
+        try:
+            yield
+        except Exception as e:
+            self.mark(name, 'failed', error=str(e), duration_seconds=round(time.perf_counter() - start, 2))
+            raise
+        self.mark(name, 'done', duration_seconds=round(time.perf_counter() - start, 2))
+
+    def skip(self, name, reason):
+        self.mark(name, 'skipped', reason=reason)
+
+    def run_stages(self, stages, executor):
+        """
+        Run independent stages concurrently, each with its own timeout.
+
+        A stage's timeout counts from when it starts running, so time spent waiting
+        for a thread on a busy executor is not charged to it; a stage that does not
+        start within STAGE_QUEUE_TIMEOUT is given up. A stage that fails or times out
+        is recorded on the job without affecting the others. A timed-out stage keeps
+        running in its thread but its result is ignored.
+
+        Args:
+            stages (dict): stage name -> (callable, timeout in seconds)
+            executor: thread pool the stages run on
+
+        Returns:
+            tuple: (results, errors) dicts keyed by stage name
+        """
+        started_at = {}
+        started = {name: threading.Event() for name in stages}
+
+        def timed(name, fn):
+            started_at[name] = time.perf_counter()
+            started[name].set()
+            self.mark(name, 'running', started_at=datetime.utcnow())
+            return fn(), time.perf_counter() - started_at[name]
+
+        futures = {}
+        for name, (fn, _) in stages.items():
+            self.mark(name, 'queued')
+            futures[name] = submit_with_context(executor, timed, name, fn)
+        queue_deadline = time.perf_counter() + STAGE_QUEUE_TIMEOUT
+
+        results = {}
+        errors = {}
+        for name, future in futures.items():
+            timeout = stages[name][1]
+            if not started[name].wait(max(queue_deadline - time.perf_counter(), 0)) and future.cancel():
+                errors[name] = f"Not started within {STAGE_QUEUE_TIMEOUT}s"
+                self.mark(name, 'timed_out', error=errors[name])
+                continue
+            # cancel() fails once the stage is running, so it is about to record its start
+            started[name].wait()
+            try:
+                results[name], duration = future.result(timeout=max(started_at[name] + timeout - time.perf_counter(), 0))
+                self.mark(name, 'done', duration_seconds=round(duration, 2))
+            except FuturesTimeout:
+                errors[name] = f"Timed out after {timeout}s"
+                self.mark(name, 'timed_out', error=errors[name])
+            except Exception as e:
+                errors[name] = str(e)
+                self.mark(name, 'failed', error=errors[name],
+                          duration_seconds=round(time.perf_counter() - started_at[name], 2))
+        return results, errors
+
+
+class JobQueue:
+    """MongoDB-backed queue of analysis jobs with a pool of polling worker threads"""
+    def __init__(self, collection, handler, stages):
+        """
+        Args:
+            collection: MongoDB collection holding the job documents
+            handler (callable): runs a Job and returns the result stored on it
+            stages (list): stage names reported on every job, in order
+        """
+        self.collection = collection
+        self.handler = handler
+        self.stages = stages
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.collection.create_index([('status', 1), ('created_at', 1)])
+        self.collection.create_index('meet_id')
+        # At most one queued or running job per meeting. Jobs carry an 'active' flag while queued
+        # or running, since partial indexes cannot filter on status $in before MongoDB 6.0.
+        self.collection.create_index(
+            [('meet_id', 1), ('active', 1)],
+            unique=True,
+            partialFilterExpression={'active': True},
+            name='one_active_job_per_meeting'
+        )
+
+    def enqueue(self, meet_id, options=None):
+        """
+        Queue an analysis unless one is already queued or running for the meeting.
+
+        Args:
+            options (dict): passed to the handler as job.options
+
+        Returns:
+            tuple: (job_id, created)
+        """
+        for _ in range(ENQUEUE_RETRIES):
+            active = self.collection.find_one({'meet_id': meet_id, 'active': True}, {'_id': 1})
+            if active:
+                return active['_id'], False
+
+            now = datetime.utcnow()
+            job_id = uuid.uuid4().hex
+            try:
+                self.collection.insert_one({
+                    '_id': job_id,
+                    'meet_id': meet_id,
+                    'status': 'queued',
+                    'active': True,
+                    'options': options or {},
+                    'stages': {name: {'status': 'pending'} for name in self.stages},
+                    'attempts': 0,
+                    'created_at': now,
+                    'updated_at': now
+                })
+            except DuplicateKeyError:
+                # Another request queued one first; return that job
+                continue
+            self.wake_event.set()
+            return job_id, True
+        raise RuntimeError(f"Could not enqueue an analysis for meet_id {meet_id}")
+
+    def get(self, job_id):
+        return self.collection.find_one({'_id': job_id})
+
+    def claim(self):
+        """Atomically take the oldest queued job, or a running one whose worker stopped heartbeating"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=JOB_STALE_SECONDS)
+        return self.collection.find_one_and_update(
+            {'$or': [{'status': 'queued'}, {'status': 'running', 'updated_at': {'$lt': stale}}]},
+            {
+                '$set': {'status': 'running', 'worker': self.worker_id, 'started_at': now, 'updated_at': now},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _heartbeat(self, job_id, done):
+        while not done.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                self.collection.update_one({'_id': job_id}, {'$set': {'updated_at': datetime.utcnow()}})
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for job {job_id}: {str(e)}")
+
+    def run(self, doc):
+        job = Job(self, doc)
+        if doc['attempts'] > MAX_JOB_ATTEMPTS:
+            job.update({
+                'status': 'failed',
+                'active': False,
+                'error': f"Gave up after {MAX_JOB_ATTEMPTS} attempts",
+                'finished_at': datetime.utcnow()
+            })
+            return
+
+        logger.info(f"Running job {job.id} for meet_id {job.meet_id} (attempt {doc['attempts']})")
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job.id, done), daemon=True).start()
+        try:
+            result = self.handler(job)
+        except Exception as e:
+            logger.error(f"Job {job.id} for meet_id {job.meet_id} failed: {str(e)}", exc_info=True)
+            job.update({'status': 'failed', 'active': False, 'error': str(e), 'finished_at': datetime.utcnow()})
+            return
+        finally:
+            done.set()
+        job.update({'status': 'done', 'active': False, 'result': result, 'finished_at': datetime.utcnow()})
+        logger.info(f"Job {job.id} for meet_id {job.meet_id} completed")
+
+    def _work(self):
+        while not self.stop_event.is_set():
+            try:
+                doc = self.claim()
+            except Exception as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                doc = None
+            if doc:
+                self.run(doc)
+                continue
+            # Woken early by a local enqueue; jobs queued by other processes are found by polling
+            self.wake_event.wait(JOB_POLL_INTERVAL)
+            self.wake_event.clear()
+
+    def start(self, workers):
+        for index in range(workers):
+            thread = threading.Thread(target=self._work, name=f'analysis-job-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if workers:
+            logger.info(f"Started {workers} analysis job workers")
+
+    def stop(self, timeout=None):
+        """Let workers finish their current job and exit"""
+        self.stop_event.set()
+        self.wake_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
@@ -0,0 +1,138 @@
+"""
+Lazily loaded NLP models for the meeting analysis service.
+
+Each model loads on first use, or up front through warmup(). Under gunicorn the
+master warms the models listed in WARMUP_MODELS before forking (see
+gunicorn.conf.py), so workers share the loaded weights copy-on-write instead of
+each loading its own copy.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Tokenizer thread pools must not be started before workers fork
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB, the peak where /proc is unavailable, or None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+class ModelRegistry:
+    """Named model loaders, each run once per process on first use"""
+    def __init__(self):
+        self.loaders = {}
+        self.load_locks = {}
+        self.models = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, loader):
+        self.loaders[name] = loader
+        self.load_locks[name] = threading.Lock()
+
+    def get(self, name):
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        if name not in self.loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self.load_locks[name]:
+            if name not in self.models:
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                model = self.loaders[name]()
+                load_seconds = time.perf_counter() - start
+                rss_after = current_rss_mb()
+                # Approximate when other models load at the same time
+                rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+                with self.lock:
+                    self.models[name] = model
+                    self.stats[name] = {
+                        'load_seconds': round(load_seconds, 2),
+                        'rss_delta_mb': round(rss_delta, 1) if rss_delta is not None else None,
+                        'loaded_at': datetime.now().isoformat(),
+                        'loaded_by_pid': os.getpid()
+                    }
+                logger.info(f"Loaded model {name} in {load_seconds:.2f}s"
+                            + (f" (+{rss_delta:.0f} MB)" if rss_delta is not None else ""))
+            return self.models[name]
+
+    def warmup(self, names=None):
+        """Load the given models, or every registered model, now"""
+        for name in (self.loaders if names is None else names):
+            self.get(name)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: process id and RSS, and per model whether it is loaded, load time and memory.
+            loaded_by_pid differs from pid for models inherited from the gunicorn master.
+        """
+        with self.lock:
+            models = {
+                name: dict(self.stats.get(name, {}), loaded=name in self.models)
+                for name in self.loaders
+            }
+        rss = current_rss_mb()
+        return {
+            'pid': os.getpid(),
+            'rss_mb': round(rss, 1) if rss is not None else None,
+            'models': models
+        }
+
+
+def _load_spacy():
+    import spacy
+    return spacy.load('en_core_web_sm')
+
+
+def _load_sentiment_pipeline():
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model="nlptown/bert-base-multilingual-uncased-sentiment")
+
+
+def _load_emotion_pipeline():
+    from transformers import pipeline
+    return pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
+
+
+def _load_keybert():
+    from keybert import KeyBERT
+    return KeyBERT()
+
+
+def _load_vader():
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+registry = ModelRegistry()
+registry.register('spacy', _load_spacy)
+registry.register('sentiment', _load_sentiment_pipeline)
+registry.register('emotion', _load_emotion_pipeline)
+registry.register('keybert', _load_keybert)
+registry.register('vader', _load_vader)
+
+# Comma-separated model names, or 'all'; empty loads everything on first use
+_warmup = os.getenv('WARMUP_MODELS', 'vader').strip()
+WARMUP_MODELS = None if _warmup == 'all' else [name.strip() for name in _warmup.split(',') if name.strip()]
@@ -0,0 +1,205 @@
+"""
+Sentence-level sentiment for meeting transcripts.
+
+The transcript is split into sentences, or into short word runs when speech-to-text
+output has no punctuation. Each distinct sentence is scored once, in batches for the
+transformer backend, and the totals, per-speaker and per-time-window rollups are
+built in a single pass over the scores.
+
+SENTIMENT_BACKEND picks the scorer: 'vader' (default, lexicon based) or
+'transformer' (the nlptown star-rating model, batched on CPU).
+"""
+import os
+import re
+
+from model_registry import registry
+
+SENTIMENT_BACKEND = os.getenv('SENTIMENT_BACKEND', 'vader')
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', '32'))
+SENTIMENT_WINDOW_SECONDS = int(os.getenv('SENTIMENT_WINDOW_SECONDS', '300'))
+# Longer runs are split so one score does not average out a whole monologue
+MAX_SENTENCE_WORDS = 40
+NEUTRAL_BAND = 0.05
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=["\'(]?[A-Z0-9])')
+ABBREVIATIONS = {'mr.', 'mrs.', 'ms.', 'dr.', 'prof.', 'e.g.', 'i.e.', 'etc.', 'vs.', 'st.', 'jr.', 'sr.', 'inc.', 'ltd.'}
+# "Name: what they said" at the start of a line, with a name of up to three capitalised words
+SPEAKER_LINE = re.compile(r"^\s*([A-Z][\w.'-]*(?: [A-Z][\w.'-]*){0,2}):\s+(.*)$")
+# Any short "label:" prefix; one that is not a speaker name ends the current speaker's turn
+LABEL_PREFIX = re.compile(r"^\s*[\w.'-]+(?: [\w.'-]+){0,5}:\s")
+# Capitalised labels that are common in notes and agendas but are not people
+NOT_SPEAKERS = {'note', 'notes', 'agenda', 'summary', 'action items', 'next steps', 'decision', 'decisions',
+                'question', 'answer', 'update', 'subject', 'date', 'time'}
+
+# nlptown predicts 1 to 5 stars; mapped onto VADER's -1..1 compound scale
+STAR_COMPOUND = {1: -1.0, 2: -0.5, 3: 0.0, 4: 0.5, 5: 1.0}
+VADER_FIELDS = ('neg', 'neu', 'pos', 'compound')
+
+
+def split_sentences(text):
+    """Split on sentence punctuation, not after common abbreviations, then cap sentence length"""
+    sentences = []
+    pending = ''
+    for piece in SENTENCE_END.split(text.strip()):
+        pending = f'{pending} {piece}' if pending else piece
+        if not pending.strip() or pending.split()[-1].lower() in ABBREVIATIONS:
+            continue
+        sentences.append(pending)
+        pending = ''
+    if pending.strip():
+        sentences.append(pending)
+
+    result = []
+    for sentence in sentences:
+        words = sentence.split()
+        for index in range(0, len(words), MAX_SENTENCE_WORDS):
+            result.append(' '.join(words[index:index + MAX_SENTENCE_WORDS]))
+    return result
+
+
+def sentence_units(transcript, segments=None):
+    """
+    Sentences with their speaker and start time where known.
+
+    Timestamped transcription segments are used when available; otherwise the
+    transcript is read line by line, following "Speaker: text" prefixes.
+
+    Returns:
+        list: (sentence, speaker or None, start seconds or None) tuples
+    """
+    units = []
+    if segments:
+        for segment in segments:
+            for sentence in split_sentences(segment.get('text') or ''):
+                units.append((sentence, None, segment.get('start')))
+        return units
+
+    speaker = None
+    for line in transcript.splitlines():
+        match = SPEAKER_LINE.match(line)
+        if match and match.group(1).strip().lower() not in NOT_SPEAKERS:
+            speaker, line = match.group(1).strip(), match.group(2)
+        elif LABEL_PREFIX.match(line):
+            # "The agenda for today: ..." is nobody's turn, and neither is what follows it
+            speaker = None
+        for sentence in split_sentences(line):
+            units.append((sentence, speaker, None))
+    return units
+
+
+def score_vader(sentences):
+    polarity_scores = registry.get('vader').polarity_scores
+    return [polarity_scores(sentence) for sentence in sentences]
+
+
+def score_transformer(sentences):
+    classifier = registry.get('sentiment')
+    outputs = classifier(sentences, batch_size=SENTIMENT_BATCH_SIZE, truncation=True)
+    return [
+        {
+            'compound': STAR_COMPOUND[int(output['label'][0])],
+            'label': output['label'],
+            'confidence': round(output['score'], 3)
+        }
+        for output in outputs
+    ]
+
+
+SCORERS = {
+    'vader': score_vader,
+    'transformer': score_transformer
+}
+
+
+def _empty_rollup():
+    return {'sentences': 0, 'positive': 0, 'negative': 0, 'neutral': 0, 'compound_sum': 0.0}
+
+
+def _add(rollup, compound):
+    rollup['sentences'] += 1
+    rollup['compound_sum'] += compound
+    if compound > NEUTRAL_BAND:
+        rollup['positive'] += 1
+    elif compound < -NEUTRAL_BAND:
+        rollup['negative'] += 1
+    else:
+        rollup['neutral'] += 1
+
+
+def _finish(rollup):
+    compound_sum = rollup.pop('compound_sum')
+    rollup['average_compound'] = round(compound_sum / rollup['sentences'], 4) if rollup['sentences'] else 0.0
+    return rollup
+
+
+def analyze_transcript_sentiment(transcript, segments=None, backend=None):
+    """
+    Score every sentence and roll the scores up overall, per speaker and per time window.
+
+    The overall scores are the word-weighted mean of the sentence scores.
+
+    Returns:
+        dict: overall_sentiment, detailed_analysis, summary counts, by_speaker and by_window
+    """
+    backend = backend or SENTIMENT_BACKEND
+    scorer = SCORERS.get(backend)
+    if scorer is None:
+        raise ValueError(f"Unknown sentiment backend: {backend}")
+
+    units = sentence_units(transcript, segments)
+    # Meetings repeat short sentences ("okay", "yeah, sure") a lot; score each once
+    unique = list(dict.fromkeys(sentence for sentence, _, _ in units))
+    scores = dict(zip(unique, scorer(unique))) if unique else {}
+
+    total = _empty_rollup()
+    speakers = {}
+    windows = {}
+    weighted = dict.fromkeys(VADER_FIELDS, 0.0)
+    total_words = 0
+    detailed = []
+    for sentence, speaker, start in units:
+        sentiment = scores[sentence]
+        compound = sentiment['compound']
+        words = len(sentence.split())
+        total_words += words
+        for field in VADER_FIELDS:
+            weighted[field] += sentiment.get(field, 0.0) * words
+
+        _add(total, compound)
+        if speaker:
+            _add(speakers.setdefault(speaker, _empty_rollup()), compound)
+        if start is not None:
+            _add(windows.setdefault(int(start // SENTIMENT_WINDOW_SECONDS), _empty_rollup()), compound)
+
+        entry = {'text': sentence, 'sentiment': sentiment}
+        if speaker:
+            entry['speaker'] = speaker
+        if start is not None:
+            entry['start'] = start
+        detailed.append(entry)
+
+    overall = {field: round(value / total_words, 4) if total_words else 0.0 for field, value in weighted.items()}
+    if backend != 'vader':
+        overall = {'compound': overall['compound']}
+
+    return {
+        'backend': backend,
+        'overall_sentiment': overall,
+        'detailed_analysis': detailed,
+        'summary': {
+            'positive_segments': total['positive'],
+            'negative_segments': total['negative'],
+            'neutral_segments': total['neutral']
+        },
+        'by_speaker': [
+            dict(_finish(rollup), speaker=speaker) for speaker, rollup in speakers.items()
+        ],
+        'by_window': [
+            dict(
+                _finish(windows[index]),
+                start=index * SENTIMENT_WINDOW_SECONDS,
+                end=(index + 1) * SENTIMENT_WINDOW_SECONDS
+            )
+            for index in sorted(windows)
+        ]
+    }
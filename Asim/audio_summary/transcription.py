@@ -0,0 +1,318 @@
+"""
+Chunked transcription for long meeting recordings.
+
+ffmpeg decodes the recording to mono 16 kHz 16-bit PCM on a pipe, and the stream
+is cut at pauses into segments of at most MAX_SEGMENT_SECONDS, the segments
+are transcribed concurrently and the results are stitched back together in order
+with their timestamps. Wall time therefore follows the slowest segment rather than
+the length of the meeting. Nothing is written to disk and at most
+MAX_PENDING_SEGMENTS segments are held in memory at once.
+
+Recognizer backends are looked up by name in RECOGNIZERS (TRANSCRIBE_BACKEND):
+'google' uses the free web API, 'sphinx' and 'whisper' run locally and need the
+optional pocketsphinx or openai-whisper packages.
+"""
+import importlib.util
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_BACKEND = os.getenv('TRANSCRIBE_BACKEND', 'google')
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '8'))
+MAX_SEGMENT_SECONDS = float(os.getenv('MAX_SEGMENT_SECONDS', '45'))
+MIN_SILENCE_MS = int(os.getenv('MIN_SILENCE_MS', '500'))
+# Pauses this long end a segment outright instead of being kept inside it
+LONG_SILENCE_MS = int(os.getenv('LONG_SILENCE_MS', '2000'))
+# Anything this many dB below the running average loudness counts as silence
+SILENCE_OFFSET_DB = float(os.getenv('SILENCE_OFFSET_DB', '16'))
+# Frames quieter than this are silence whatever the average (about -60 dBFS)
+SILENCE_FLOOR_ENERGY = (32768 * 10 ** (-60 / 20)) ** 2
+SEGMENT_TIMEOUT = int(os.getenv('SEGMENT_TIMEOUT', '120'))
+SEGMENT_RETRIES = 2
+SEGMENT_PADDING_MS = 200
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+MAX_PENDING_SEGMENTS = TRANSCRIBE_WORKERS * 2
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * FRAME_MS // 1000
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+def _recognize_google(recognizer, audio_data):
+    return recognizer.recognize_google(audio_data)
+
+
+def _recognize_sphinx(recognizer, audio_data):
+    return recognizer.recognize_sphinx(audio_data)
+
+
+def _recognize_whisper(recognizer, audio_data):
+    return recognizer.recognize_whisper(audio_data, model=WHISPER_MODEL)
+
+
+RECOGNIZERS = {
+    'google': _recognize_google,
+    'sphinx': _recognize_sphinx,
+    'whisper': _recognize_whisper
+}
+
+# Optional packages the local backends need, checked without importing them
+BACKEND_MODULES = {
+    'google': None,
+    'sphinx': 'pocketsphinx',
+    'whisper': 'whisper'
+}
+
+_audio_tools = None
+_probe_lock = threading.Lock()
+
+
+def probe_audio_tools(refresh=False):
+    """
+    Check for ffmpeg and the recognizer backends. The probe runs once per process
+    and the cached result is returned afterwards unless refresh is set.
+
+    Returns:
+        dict: ffmpeg path and version, backend availability and whether the
+        configured backend can run
+    """
+    global _audio_tools
+    with _probe_lock:
+        if _audio_tools is None or refresh:
+            ffmpeg_path = shutil.which('ffmpeg')
+            version = None
+            if ffmpeg_path:
+                try:
+                    output = subprocess.run(
+                        [ffmpeg_path, '-version'], capture_output=True, text=True, timeout=10, check=True
+                    ).stdout
+                    version = output.split('\n', 1)[0]
+                except (subprocess.SubprocessError, OSError):
+                    ffmpeg_path = None
+            backends = {
+                name: module is None or importlib.util.find_spec(module) is not None
+                for name, module in BACKEND_MODULES.items()
+            }
+            _audio_tools = {
+                'ffmpeg': {'available': ffmpeg_path is not None, 'path': ffmpeg_path, 'version': version},
+                'backends': backends,
+                'default_backend': TRANSCRIBE_BACKEND,
+                'ready': ffmpeg_path is not None and backends.get(TRANSCRIBE_BACKEND, False),
+                'checked_at': datetime.now().isoformat()
+            }
+        return _audio_tools
+
+
+transcribe_executor = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix='transcribe')
+_local = threading.local()
+
+
+def _recognizer():
+    # One recognizer per worker thread so local backends load their model once per thread
+    if not hasattr(_local, 'recognizer'):
+        _local.recognizer = sr.Recognizer()
+        _local.recognizer.operation_timeout = SEGMENT_TIMEOUT
+    return _local.recognizer
+
+
+def _ms_to_bytes(ms):
+    return int(ms) // FRAME_MS * FRAME_BYTES
+
+
+def _bytes_to_ms(size):
+    return size // FRAME_BYTES * FRAME_MS
+
+
+def _frame_energy(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.mean(samples * samples)) if len(samples) else 0.0
+
+
+def stream_segments(stream, max_segment_ms=None):
+    """
+    Cut a mono 16 kHz 16-bit PCM stream into segments of at most max_segment_ms.
+
+    Segments end at the last pause of at least MIN_SILENCE_MS where possible and
+    pauses longer than LONG_SILENCE_MS are dropped.
+
+    Yields:
+        tuple: (start_ms, end_ms, pcm_bytes)
+    """
+    max_bytes = _ms_to_bytes(max_segment_ms or MAX_SEGMENT_SECONDS * 1000)
+    padding_frames = SEGMENT_PADDING_MS // FRAME_MS
+    preroll = deque(maxlen=padding_frames)
+    segment = None
+    segment_start = 0
+    cut = None
+    silence_ms = 0
+    energy_sum = 0.0
+    frames = 0
+
+    while True:
+        frame = stream.read(FRAME_BYTES)
+        if len(frame) < FRAME_BYTES:
+            break
+        position = frames * FRAME_MS
+        frames += 1
+
+        # Threshold relative to the average loudness seen so far
+        energy = _frame_energy(frame)
+        energy_sum += energy
+        average = energy_sum / frames
+        loud = energy > SILENCE_FLOOR_ENERGY and 10 * math.log10(energy / average) > -SILENCE_OFFSET_DB
+
+        if segment is None:
+            if not loud:
+                preroll.append(frame)
+                continue
+            segment = bytearray(b''.join(preroll))
+            segment_start = position - len(preroll) * FRAME_MS
+            preroll.clear()
+            cut = None
+            silence_ms = 0
+
+        segment += frame
+        if loud:
+            silence_ms = 0
+        else:
+            silence_ms += FRAME_MS
+        # Bytes up to the end of the speech before the current pause, plus a little padding
+        speech_end = len(segment) - _ms_to_bytes(max(silence_ms - SEGMENT_PADDING_MS, 0))
+        if silence_ms >= MIN_SILENCE_MS > silence_ms - FRAME_MS:
+            cut = speech_end
+
+        if silence_ms >= LONG_SILENCE_MS:
+            if speech_end > 0:
+                yield segment_start, segment_start + _bytes_to_ms(speech_end), bytes(segment[:speech_end])
+            segment = None
+        elif len(segment) >= max_bytes:
+            split = cut if cut else len(segment)
+            yield segment_start, segment_start + _bytes_to_ms(split), bytes(segment[:split])
+            segment_start += _bytes_to_ms(split)
+            segment = segment[split:]
+            cut = None
+
+    if segment and silence_ms < _bytes_to_ms(len(segment)):
+        end = len(segment) - _ms_to_bytes(max(silence_ms - SEGMENT_PADDING_MS, 0))
+        yield segment_start, segment_start + _bytes_to_ms(end), bytes(segment[:end])
+
+
+def _transcribe_segment(pcm, start, end, recognize):
+    audio_data = sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+    error = None
+    for attempt in range(SEGMENT_RETRIES + 1):
+        try:
+            return recognize(_recognizer(), audio_data), None
+        except sr.UnknownValueError:
+            # Nothing intelligible in this segment
+            return '', None
+        except sr.RequestError as e:
+            error = str(e)
+            logger.warning(f"Segment {start / 1000:.1f}s-{end / 1000:.1f}s failed (attempt {attempt + 1}): {error}")
+    return '', error
+
+
+def transcribe_stream(stream, backend=None):
+    """
+    Transcribe a mono 16 kHz 16-bit PCM stream segment by segment.
+
+    Returns:
+        dict: text, backend, per-segment start/end seconds and text, and failed_segments
+    """
+    backend = backend or TRANSCRIBE_BACKEND
+    recognize = RECOGNIZERS.get(backend)
+    if recognize is None:
+        raise TranscriptionError(f"Unknown transcription backend: {backend}")
+    if not probe_audio_tools()['backends'].get(backend, True):
+        raise TranscriptionError(f"Transcription backend '{backend}' needs {BACKEND_MODULES[backend]}, which is not installed")
+
+    # Limits how much decoded audio waits for a free worker
+    pending = threading.BoundedSemaphore(MAX_PENDING_SEGMENTS)
+
+    def run(pcm, start, end):
+        try:
+            return _transcribe_segment(pcm, start, end, recognize)
+        finally:
+            pending.release()
+
+    segments = []
+    futures = []
+    try:
+        for start, end, pcm in stream_segments(stream):
+            pending.acquire()
+            segments.append((start, end))
+            futures.append(transcribe_executor.submit(run, pcm, start, end))
+    except BaseException:
+        # Drop queued segments so a broken stream does not keep the workers busy; running ones finish on their own
+        for future in futures:
+            future.cancel()
+        raise
+
+    results = []
+    failed = 0
+    for (start, end), future in zip(segments, futures):
+        text, error = future.result()
+        if error:
+            failed += 1
+        results.append({
+            'start': round(start / 1000, 2),
+            'end': round(end / 1000, 2),
+            'text': text,
+            'error': error
+        })
+    logger.info(f"Transcribed {len(results)} segments with {backend}, {failed} failed")
+
+    if segments and failed == len(segments):
+        raise TranscriptionError(f"All {failed} segments failed: {results[0]['error']}")
+    return {
+        'text': ' '.join(r['text'] for r in results if r['text']),
+        'backend': backend,
+        'segments': results,
+        'failed_segments': failed
+    }
+
+
+def transcribe_file(path, backend=None):
+    """Decode any format ffmpeg reads straight into the transcriber through a pipe"""
+    ffmpeg = probe_audio_tools()['ffmpeg']
+    if not ffmpeg['available']:
+        raise TranscriptionError("ffmpeg is not installed or not accessible")
+    # stderr goes to a file: an undrained pipe would block ffmpeg once it fills up
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            [
+                ffmpeg['path'], '-nostdin', '-loglevel', 'error', '-i', str(path),
+                '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=stderr_file
+        )
+        try:
+            result = transcribe_stream(process.stdout, backend)
+            if process.wait() != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode('utf-8', errors='replace').strip()
+                raise TranscriptionError(f"ffmpeg could not decode {path}: {stderr}")
+            return result
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
@@ -0,0 +1,23 @@
+"""
+Standalone meeting analysis worker. Runs queued /analyze jobs without serving HTTP,
+so workers can be scaled separately from the web server (run that with JOB_WORKERS=0):
+
+    JOB_WORKERS=4 python worker.py
+"""
+import signal
+import threading
+
+from audio import JOB_WORKERS, job_queue, logger
+
+if __name__ == '__main__':
+    if not JOB_WORKERS:
+        raise SystemExit("JOB_WORKERS must be at least 1 for a worker process")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info(f"Analysis worker running with {JOB_WORKERS} threads")
+    stop.wait()
+
+    logger.info("Stopping analysis worker after current jobs...")
+    job_queue.stop()
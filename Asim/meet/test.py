@@ -10,11 +10,18 @@ from dotenv import load_dotenv
 import re
 from pymongo import MongoClient
 from flask_cors import CORS  # Add this import
+from pathlib import Path
+import sys
+
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.llm_metrics import instrument_flask_app, track_call
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'meet_scheduler')
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 # MongoDB connection setup
@@ -78,7 +85,9 @@ Current Context:
         # Use GOOGLECALENDAR_FIND_FREE_SLOTS to get the schedule
         schedule_prompt = f"CHECK_FREE_SLOTS for {email} on {date}"
         try:
-            result = self.agent_executor.invoke({"input": schedule_prompt})
+            with track_call('agent', 'openai', 'composio-agent', schedule_prompt) as call:
+                result = self.agent_executor.invoke({"input": schedule_prompt})
+                call.set_response(result.get('output', ''))
             return result
         except Exception as e:
             return {
@@ -109,7 +118,9 @@ Current Context:
     """
         
         try:
-            result = self.agent_executor.invoke({"input": enhanced_prompt})
+            with track_call('agent', 'openai', 'composio-agent', enhanced_prompt) as call:
+                result = self.agent_executor.invoke({"input": enhanced_prompt})
+                call.set_response(result.get('output', ''))
             
             # Modify output to always offer options
             options = ["Yes", "No"]
@@ -207,7 +218,9 @@ DETAILS: [relevant details like time, participants, etc.]
 """
         
         # Get the decision from OpenAI
-        decision_result = scheduler.agent_executor.invoke({"input": decision_prompt})
+        with track_call('agent', 'openai', 'composio-agent', decision_prompt) as call:
+            decision_result = scheduler.agent_executor.invoke({"input": decision_prompt})
+            call.set_response(decision_result.get('output', ''))
         action_output = decision_result['output']
         # Parse the action and details
         action_match = re.search(r'ACTION:\s*(.*?)\n', action_output)
@@ -239,7 +252,9 @@ DETAILS: [relevant details like time, participants, etc.]
             After creating the meet, send an email to all participants with the meeting link and details.
             """
             
-            result = scheduler.agent_executor.invoke({"input": creation_prompt})
+            with track_call('agent', 'openai', 'composio-agent', creation_prompt) as call:
+                result = scheduler.agent_executor.invoke({"input": creation_prompt})
+                call.set_response(result.get('output', ''))
             
             return jsonify({
                 "status": "success",
@@ -257,7 +272,9 @@ DETAILS: [relevant details like time, participants, etc.]
             Please suggest 3 alternative time slots.
             """
             
-            result = scheduler.agent_executor.invoke({"input": suggestion_prompt})
+            with track_call('agent', 'openai', 'composio-agent', suggestion_prompt) as call:
+                result = scheduler.agent_executor.invoke({"input": suggestion_prompt})
+                call.set_response(result.get('output', ''))
             
             return jsonify({
                 "status": "success",
@@ -334,7 +351,9 @@ DETAILS: [Include:
 """
         
         # Get the decision from OpenAI
-        decision_result = scheduler.agent_executor.invoke({"input": decision_prompt})
+        with track_call('agent', 'openai', 'composio-agent', decision_prompt) as call:
+            decision_result = scheduler.agent_executor.invoke({"input": decision_prompt})
+            call.set_response(decision_result.get('output', ''))
         action_output = decision_result['output']
         # Parse the details
         details_match = re.search(r'DETAILS:\s*(.*)', action_output, re.DOTALL)
@@ -366,7 +385,9 @@ DETAILS: [Include:
         3. Return the meeting link and confirmation
         """
         
-        result = scheduler.agent_executor.invoke({"input": creation_prompt})
+        with track_call('agent', 'openai', 'composio-agent', creation_prompt) as call:
+            result = scheduler.agent_executor.invoke({"input": creation_prompt})
+            call.set_response(result.get('output', ''))
         
         return jsonify({
             "status": "success",
@@ -18,9 +18,14 @@ import numpy as np
 from apscheduler.schedulers.background import BackgroundScheduler
 import json
 import logging
+import sys
 from pathlib import Path
 from flask_cors import CORS 
 
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.llm_metrics import instrument_flask_app, track_call
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,14 +42,16 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+instrument_flask_app(app, 'notion_tasks')
 
 # Initialize LangChain and Composio components
 llm = ChatOpenAI()
 prompt = hub.pull("hwchase17/openai-functions-agent")
 
 # Initialize Gemini
+GEMINI_MODEL = "gemini-pro"
 gemini = ChatGoogleGenerativeAI(
-    model="gemini-pro",
+    model=GEMINI_MODEL,
     temperature=0,
     google_api_key=os.getenv("GOOGLE_API_KEY")
 )
@@ -181,7 +188,9 @@ def extract_task_info(email_body):
             current_day=context['current_day'],
             current_time=context['current_time']
         )
-        response = gemini.invoke(extraction_input)
+        with track_call('generate', 'gemini', GEMINI_MODEL, extraction_input) as call:
+            response = gemini.invoke(extraction_input)
+            call.set_response(response.content)
         extracted_data = output_parser.parse(response.content)
         logger.info(f"Successfully extracted task info: {extracted_data['name']}")
         return extracted_data
@@ -244,7 +253,9 @@ def generate_ai_insights(df):
         Format the response in HTML with proper headers and bullet points.
         """
         
-        response = gemini.invoke(analysis_prompt)
+        with track_call('generate', 'gemini', GEMINI_MODEL, analysis_prompt) as call:
+            response = gemini.invoke(analysis_prompt)
+            call.set_response(response.content)
         return response.content
     except Exception as e:
         logger.error(f"Error generating AI insights: {e}")
@@ -595,7 +606,9 @@ def create_task():
         Use the database ID: {os.getenv('NOTION_DATABASE_ID')}
         """
         
-        result = agent_executor.invoke({"input": task_prompt})
+        with track_call('agent', 'openai', 'composio-agent', task_prompt) as call:
+            result = agent_executor.invoke({"input": task_prompt})
+            call.set_response(result.get('output', ''))
         
         # Trigger analysis update
         generate_task_analysis()
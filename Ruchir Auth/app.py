@@ -11,6 +11,12 @@ from composio_langchain import ComposioToolSet, Action, App
 from datetime import datetime
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from pathlib import Path
+import sys
+
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.llm_metrics import instrument_flask_app, track_call
 
 # Load environment variables
 load_dotenv()
@@ -37,6 +43,7 @@ def get_database():
 # Initialize Flask app and database
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'auth_agent')
 db = get_database()
 
 @app.route('/api-auth', methods=['POST'])
@@ -101,7 +108,9 @@ def get_events():
         agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
         task = f"give me max_results=5 next events timeMin={formatted_date}"
 
-        result = agent_executor.invoke({"input": task})
+        with track_call('agent', 'openai', 'composio-agent', task) as call:
+            result = agent_executor.invoke({"input": task})
+            call.set_response(result.get('output', ''))
         return jsonify(result)
 
     except Exception as e:
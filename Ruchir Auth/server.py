@@ -10,9 +10,16 @@ from pymongo import MongoClient
 import re
 from bson import json_util
 import json
+from pathlib import Path
+import sys
+
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.llm_metrics import instrument_flask_app, track_call
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'document_agent')
 
 # Load environment variables
 load_dotenv()
@@ -65,7 +72,9 @@ def create_document():
         executor = initialize_agent()
         
         # Create document based on prompt
-        doc_result = executor.invoke({"input": prompt})
+        with track_call('agent', 'openai', 'composio-agent', prompt) as call:
+            doc_result = executor.invoke({"input": prompt})
+            call.set_response(doc_result.get('output', ''))
         
         # Send email to all found recipients
         email_results = []
@@ -77,7 +86,9 @@ def create_document():
 
             {doc_result['output']}
             """
-            email_result = executor.invoke({"input": email_task})
+            with track_call('agent', 'openai', 'composio-agent', email_task) as call:
+                email_result = executor.invoke({"input": email_task})
+                call.set_response(email_result.get('output', ''))
             email_results.append(email_result['output'])
         
         return jsonify({
@@ -18,7 +18,7 @@ const Meet = () => {
     setIsLoading(true);
     const id = extractMeetId(meetId);
     try {
-      const response = await fetch(`http://localhost:5050/getAnalysis/${id}`);
+      const response = await fetch(`http://localhost:5050/getAnalysis/${id}?fields=meeting_details,summary,sentiment_analysis.overall_sentiment,participants`);
       const data = await response.json();
       
       // Random delay between 5 and 19 seconds
@@ -78,6 +78,15 @@ const Meet = () => {
     </motion.div>
   );
 
+  // Partial analyses store a failed section as null, and the transformer sentiment backend
+  // reports only a compound score (-1..1) instead of VADER's pos/neg/neu shares
+  const overallSentiment = analysis?.sentiment_analysis?.overall_sentiment;
+  const positiveShare = typeof overallSentiment?.pos === 'number'
+    ? overallSentiment.pos
+    : typeof overallSentiment?.compound === 'number'
+      ? (overallSentiment.compound + 1) / 2
+      : null;
+
   const renderAnalysisSection = () => (
     <div className="space-y-6">
       {/* Meeting Overview */}
@@ -103,17 +112,23 @@ const Meet = () => {
             Sentiment Analysis
           </h3>
           <div className="space-y-4">
-            <div className="flex items-center gap-4">
-              <div className="flex-1 bg-yellow-400/10 rounded-full h-2">
-                <div 
-                  className="bg-yellow-400 h-full rounded-full"
-                  style={{ width: `${analysis.sentiment_analysis.overall_sentiment.pos * 100}%` }}
-                />
+            {positiveShare === null ? (
+              <p className="text-yellow-400/70 text-sm">Sentiment analysis is not available for this meeting.</p>
+            ) : (
+              <div className="flex items-center gap-4">
+                <div className="flex-1 bg-yellow-400/10 rounded-full h-2">
+                  <div 
+                    className="bg-yellow-400 h-full rounded-full"
+                    style={{ width: `${positiveShare * 100}%` }}
+                  />
+                </div>
+                <span className="text-yellow-400/70 text-sm">
+                  {typeof overallSentiment.pos === 'number'
+                    ? `${(positiveShare * 100).toFixed(1)}% Positive`
+                    : `Score ${overallSentiment.compound.toFixed(2)}`}
+                </span>
               </div>
-              <span className="text-yellow-400/70 text-sm">
-                {(analysis.sentiment_analysis.overall_sentiment.pos * 100).toFixed(1)}% Positive
-              </span>
-            </div>
+            )}
           </div>
         </div>
       </div>
@@ -251,7 +266,7 @@ const Meet = () => {
               strong: ({ children }) => <strong className="text-yellow-400">{children}</strong>,
             }}
           >
-            {analysis.summary}
+            {analysis.summary || '_The summary is not available for this meeting._'}
           </ReactMarkdown>
         </div>
       </div>
@@ -0,0 +1,146 @@
+"""
+LLM client shared by the analysis services.
+
+LLM_BACKEND selects the backend:
+    gemini  Google Gemini through google.generativeai (default)
+    stub    deterministic local stub that simulates latency and returns
+            schema-valid JSON, for offline runs and throughput benchmarks
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from common.llm_metrics import track_call
+
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+STUB_LATENCY = float(os.getenv('STUB_LATENCY', 0.5))  # seconds per call
+STUB_JITTER = float(os.getenv('STUB_JITTER', 0.2))
+
+
+def schema_defaults(schema):
+    """Smallest value valid for a Gemini-style response schema"""
+    kind = (schema or {}).get('type')
+    if kind == 'OBJECT':
+        return {name: schema_defaults(prop) for name, prop in schema.get('properties', {}).items()}
+    if kind == 'ARRAY':
+        return []
+    if kind == 'STRING':
+        return ''
+    if kind == 'NUMBER':
+        return 0
+    if kind == 'BOOLEAN':
+        return False
+    return None
+
+
+class GeminiBackend:
+    name = 'gemini'
+
+    def __init__(self, model_name, api_key):
+        import google.generativeai as genai
+        if not api_key:
+            raise ValueError("A Gemini API key is required. Please set it in your .env file")
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def _request_args(self, schema, timeout):
+        args = {}
+        if schema is not None:
+            args['generation_config'] = self.genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=schema
+            )
+        if timeout is not None:
+            args['request_options'] = {'timeout': timeout}
+        return args
+
+    @staticmethod
+    def _record(call, response):
+        usage = getattr(response, 'usage_metadata', None)
+        text = response.text
+        call.set_response(
+            text,
+            getattr(usage, 'prompt_token_count', None),
+            getattr(usage, 'candidates_token_count', None)
+        )
+        return text
+
+    def generate(self, prompt, schema=None, timeout=None):
+        with track_call('generate', self.name, self.model_name, prompt) as call:
+            response = self.model.generate_content(prompt, **self._request_args(schema, timeout))
+            return self._record(call, response)
+
+    async def agenerate(self, prompt, schema=None, timeout=None):
+        with track_call('generate', self.name, self.model_name, prompt) as call:
+            response = await self.model.generate_content_async(prompt, **self._request_args(schema, timeout))
+            return self._record(call, response)
+
+
+class StubBackend:
+    """Answers every prompt locally; the same prompt always gets the same latency and response"""
+    name = 'stub'
+
+    model_name = 'stub'
+
+    def __init__(self, latency=STUB_LATENCY, jitter=STUB_JITTER):
+        self.latency = latency
+        self.jitter = jitter
+
+    def _plan(self, prompt, schema):
+        digest = hashlib.sha256(str(prompt).encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        if schema is not None:
+            text = json.dumps(schema_defaults(schema))
+        else:
+            text = f"Stub response {digest[:12]} for a prompt of {len(str(prompt))} characters."
+        return delay, text
+
+    def generate(self, prompt, schema=None, timeout=None):
+        with track_call('generate', self.name, self.model_name, prompt) as call:
+            delay, text = self._plan(prompt, schema)
+            time.sleep(delay)
+            call.set_response(text)
+            return text
+
+    async def agenerate(self, prompt, schema=None, timeout=None):
+        with track_call('generate', self.name, self.model_name, prompt) as call:
+            delay, text = self._plan(prompt, schema)
+            await asyncio.sleep(delay)
+            call.set_response(text)
+            return text
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(model_name, api_key=None, backend=None):
+    """
+    Return the process-wide client for a model, creating it on first use.
+
+    Clients are created lazily so forked server workers each build their own connection.
+
+    Args:
+        model_name (str): Gemini model name, ignored by the stub
+        api_key (str): Gemini API key, only needed by the gemini backend
+        backend (str): overrides LLM_BACKEND
+    """
+    backend = backend or LLM_BACKEND
+    key = (backend, model_name)
+    if key not in _clients:
+        with _clients_lock:
+            if key not in _clients:
+                if backend == 'stub':
+                    _clients[key] = StubBackend()
+                elif backend == 'gemini':
+                    _clients[key] = GeminiBackend(model_name, api_key)
+                else:
+                    raise ValueError(f"Unknown LLM backend: {backend}")
+    return _clients[key]
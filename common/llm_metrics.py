@@ -0,0 +1,186 @@
+"""
+Per-call accounting for LLM and agent calls.
+
+Every call records its duration, prompt/response size, token counts and error type,
+labelled by service and Flask endpoint. Totals are exported in the Prometheus text
+format on /metrics and each call is also logged as one JSON line on the
+'llm_calls' logger. Metrics are kept per process, so under gunicorn each worker
+reports its own series.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'unknown')
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+current_endpoint = contextvars.ContextVar('current_endpoint', default='none')
+
+call_logger = logging.getLogger('llm_calls')
+if not call_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    call_logger.addHandler(_handler)
+    call_logger.setLevel(os.getenv('LLM_CALL_LOG_LEVEL', 'INFO'))
+    call_logger.propagate = False
+
+
+class CallRecord:
+    """Filled in by the caller while a tracked call runs"""
+    def __init__(self, operation, backend, model, prompt):
+        self.operation = operation
+        self.backend = backend
+        self.model = model
+        self.prompt_chars = len(str(prompt))
+        self.response_chars = 0
+        self.prompt_tokens = None
+        self.response_tokens = None
+        self.error_type = None
+
+    def set_response(self, text, prompt_tokens=None, response_tokens=None):
+        self.response_chars = len(str(text))
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+
+
+class LLMMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.durations = {}
+        self.sums = defaultdict(float)
+        self.cache_lookups = defaultdict(int)
+
+    def record(self, record, duration):
+        labels = (SERVICE_NAME, current_endpoint.get(), record.operation, record.backend, record.model)
+        status = record.error_type or 'ok'
+        # Backends that do not report usage are estimated at 4 characters per token
+        prompt_tokens = record.prompt_tokens
+        if prompt_tokens is None:
+            prompt_tokens = record.prompt_chars // 4
+        response_tokens = record.response_tokens
+        if response_tokens is None:
+            response_tokens = record.response_chars // 4
+
+        with self.lock:
+            self.calls[labels + (status,)] += 1
+            buckets = self.durations.setdefault(labels, [0] * (len(DURATION_BUCKETS) + 1))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            buckets[-1] += 1
+            self.sums[('duration', labels)] += duration
+            self.sums[('prompt_chars', labels)] += record.prompt_chars
+            self.sums[('response_chars', labels)] += record.response_chars
+            self.sums[('prompt_tokens', labels)] += prompt_tokens
+            self.sums[('response_tokens', labels)] += response_tokens
+
+        call_logger.info(json.dumps({
+            'event': 'llm_call',
+            'service': labels[0],
+            'endpoint': labels[1],
+            'operation': record.operation,
+            'backend': record.backend,
+            'model': record.model,
+            'duration_ms': round(duration * 1000, 1),
+            'prompt_chars': record.prompt_chars,
+            'response_chars': record.response_chars,
+            'prompt_tokens': prompt_tokens,
+            'response_tokens': response_tokens,
+            'tokens_estimated': record.prompt_tokens is None,
+            'error_type': record.error_type
+        }))
+
+    def record_cache_lookup(self, result):
+        """Count an analysis cache lookup: 'hit', 'miss' or another short-circuit such as 'prefiltered'"""
+        with self.lock:
+            self.cache_lookups[(SERVICE_NAME, current_endpoint.get(), result)] += 1
+        call_logger.info(json.dumps({
+            'event': 'llm_cache_lookup',
+            'service': SERVICE_NAME,
+            'endpoint': current_endpoint.get(),
+            'result': result
+        }))
+
+    @staticmethod
+    def _labels(names, values):
+        return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+    def render_prometheus(self):
+        """Current totals in the Prometheus text exposition format"""
+        names = ('service', 'endpoint', 'operation', 'backend', 'model')
+        lines = []
+        with self.lock:
+            lines.append('# TYPE llm_calls_total counter')
+            for key, count in sorted(self.calls.items()):
+                lines.append(f'llm_calls_total{{{self._labels(names + ("status",), key)}}} {count}')
+
+            lines.append('# TYPE llm_call_duration_seconds histogram')
+            for labels, buckets in sorted(self.durations.items()):
+                label_text = self._labels(names, labels)
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'llm_call_duration_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'llm_call_duration_seconds_bucket{{{label_text},le="+Inf"}} {buckets[-1]}')
+                lines.append(f'llm_call_duration_seconds_sum{{{label_text}}} {self.sums[("duration", labels)]:.6f}')
+                lines.append(f'llm_call_duration_seconds_count{{{label_text}}} {buckets[-1]}')
+
+            for metric in ('prompt_chars', 'response_chars', 'prompt_tokens', 'response_tokens'):
+                lines.append(f'# TYPE llm_{metric}_total counter')
+                for labels in sorted(self.durations):
+                    value = self.sums[(metric, labels)]
+                    lines.append(f'llm_{metric}_total{{{self._labels(names, labels)}}} {value:.0f}')
+
+            lines.append('# TYPE llm_cache_lookups_total counter')
+            for key, count in sorted(self.cache_lookups.items()):
+                label_text = self._labels(('service', 'endpoint', 'result'), key)
+                lines.append(f'llm_cache_lookups_total{{{label_text}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = LLMMetrics()
+
+
+@contextmanager
+def track_call(operation, backend, model, prompt):
+    """
+    Time an LLM or agent call and record it, including failures.
+
+    Usage:
+        with track_call('agent', 'openai', 'composio-agent', prompt) as call:
+            result = executor.invoke({"input": prompt})
+            call.set_response(result['output'])
+    """
+    record = CallRecord(operation, backend, model, prompt)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error_type = type(e).__name__
+        raise
+    finally:
+        metrics.record(record, time.perf_counter() - start)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """Submit to a thread pool keeping the caller's endpoint label"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def instrument_flask_app(app, service_name):
+    """Label LLM calls with the Flask endpoint that made them and serve /metrics"""
+    global SERVICE_NAME
+    from flask import Response, request
+    SERVICE_NAME = os.getenv('SERVICE_NAME', service_name)
+
+    @app.before_request
+    def _set_endpoint():
+        current_endpoint.set(request.endpoint or 'unknown')
+
+    @app.route('/metrics', methods=['GET'])
+    def _metrics():
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
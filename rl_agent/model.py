@@ -1,8 +1,9 @@
 from flask import Flask, jsonify, request
 from pymongo import MongoClient
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 import numpy as np
 import random
@@ -20,20 +21,26 @@ from keras.models import Sequential
 from keras.layers import Dense
 from flask_cors import CORS
 
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.llm_client import get_llm_client
+from common.llm_metrics import instrument_flask_app
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'user_suggestions')
 
 # Initialize MongoDB connection
 client = MongoClient(os.getenv('MONGODB_URI'))
 db = client['SPIT_HACK']
 user_actions_collection = db['user_data']
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Gemini client, created on first use (LLM_BACKEND=stub runs without network)
+def get_llm():
+    return get_llm_client('gemini-2.0-flash', os.getenv('GEMINI_API_KEY'))
 
 def format_user_history(actions):
     """Format user history into a structured prompt for Gemini."""
@@ -329,14 +336,14 @@ def get_user_suggestions(user_id):
        
         print("prompt:", prompt)
         # Get suggestions from Gemini
-        response = model.generate_content(prompt)
+        response = get_llm().generate(prompt)
         print("response:", response)
         # Parse and structure Gemini's response
         suggestions = {
             'user_id': user_id,
             'timestamp': datetime.now().isoformat(),
             'recent_actions_analyzed': len(user_actions),
-            'suggestions': response.text,
+            'suggestions': response,
             'user_patterns': {
                 'most_used_agent': max(set(a['agent_used'] for a in user_actions), 
                                      key=lambda x: sum(1 for a in user_actions if a['agent_used'] == x)),
@@ -9,7 +9,16 @@ from pymongo import MongoClient
 import pickle
 import datetime
 import base64  # added import
+import json
 import requests  # added import
+import hashlib
+import hmac
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 
 # Load environment variables
 load_dotenv()
@@ -18,17 +27,180 @@ load_dotenv()
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 GMAIL_CREDENTIALS = os.getenv('GMAIL_CREDENTIALS', 'credentials.json')
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 120))  # 2 minutes in seconds
+GMAIL_TOKEN = os.getenv('GMAIL_TOKEN', 'token.pickle')
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', 300))  # refresh 5 minutes before expiry
+
+# Multi-account mode: one token file per mailbox, named <account_id>.pickle
+GMAIL_TOKENS_DIR = os.getenv('GMAIL_TOKENS_DIR')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 1))
+SHARD_INDEX = os.getenv('SHARD_INDEX')  # run a single shard instead of spawning all of them
+POLL_WORKERS = int(os.getenv('POLL_WORKERS', 8))
+API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', 5))  # Gmail API calls per second per account
+
+# Adaptive polling bounds
+MIN_CHECK_INTERVAL = int(os.getenv('MIN_CHECK_INTERVAL', 15))
+MAX_CHECK_INTERVAL = int(os.getenv('MAX_CHECK_INTERVAL', 600))
+
+# Push mode: Gmail publishes changes to this Pub/Sub topic, whose push subscription
+# targets http://<host>:PUSH_PORT/gmail/push?token=PUSH_TOKEN
+PUSH_TOPIC = os.getenv('PUSH_TOPIC')  # projects/<project>/topics/<topic>
+PUSH_PORT = int(os.getenv('PUSH_PORT', 8085))
+PUSH_TOKEN = os.getenv('PUSH_TOKEN')  # required in push mode
+WATCH_RENEW_MARGIN = 24 * 60 * 60  # renew the watch a day before Gmail expires it
+
+# Failed analyses are retried with exponential backoff before the email is stored without one
+MAX_ANALYSIS_ATTEMPTS = int(os.getenv('MAX_ANALYSIS_ATTEMPTS', 5))
+RETRY_BACKOFF = int(os.getenv('RETRY_BACKOFF', 60))  # seconds, doubled per attempt
+
+# Headers forwarded to the analysis service so it can skip bulk mail without the LLM
+BULK_HEADERS = ('list-unsubscribe', 'list-id', 'precedence', 'auto-submitted', 'x-auto-response-suppress')
+
+# Body extraction limits
+MAX_BODY_CHARS = int(os.getenv('MAX_BODY_CHARS', 20000))
+MAX_HTML_BYTES = int(os.getenv('MAX_HTML_BYTES', 500000))  # raw HTML scanned before stripping tags
+
+class RateLimiter:
+    """Token bucket limiting the rate of Gmail API calls for one account"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveInterval:
+    """Polling interval that shrinks while mail is arriving and backs off when idle"""
+    def __init__(self, initial=CHECK_INTERVAL, minimum=MIN_CHECK_INTERVAL, maximum=MAX_CHECK_INTERVAL,
+                 speedup=0.5, backoff=1.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.speedup = speedup
+        self.backoff = backoff
+        self.current = min(max(initial, minimum), maximum)
+
+    def update(self, new_emails):
+        """Return the next interval given how many emails the last cycle found"""
+        if new_emails:
+            self.current = max(self.minimum, self.current * self.speedup)
+        else:
+            self.current = min(self.maximum, self.current * self.backoff)
+        return self.current
+
+class PushHandler(BaseHTTPRequestHandler):
+    """Receives Pub/Sub push deliveries of Gmail change notifications"""
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/gmail/push':
+            self.send_response(404)
+            self.end_headers()
+            return
+        token = parse_qs(url.query).get('token', [''])[0]
+        if not PUSH_TOKEN or not hmac.compare_digest(token.encode('utf-8'), PUSH_TOKEN.encode('utf-8')):
+            self.send_response(403)
+            self.end_headers()
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            envelope = json.loads(self.rfile.read(length) or b'{}')
+            data = envelope.get('message', {}).get('data', '')
+            notification = json.loads(base64.b64decode(data)) if data else {}
+        except Exception as e:
+            print(f"Invalid push notification: {str(e)}")
+            notification = {}
+
+        self.server.on_notification(notification)
+        # Any 2xx acknowledges the message so Pub/Sub does not redeliver it
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_push_server(on_notification, port=PUSH_PORT):
+    """Serve the push webhook from a background thread"""
+    # Anyone who can reach the port could otherwise trigger fetches
+    if not PUSH_TOKEN:
+        raise ValueError("PUSH_TOKEN is required when PUSH_TOPIC is set")
+    server = ThreadingHTTPServer(('0.0.0.0', port), PushHandler)
+    server.on_notification = on_notification
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Push webhook listening on port {port}")
+    return server
+
+class HTMLTextExtractor(HTMLParser):
+    """Collect the visible text of an HTML document, skipping scripts and styles"""
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+    BLOCK_TAGS = {'br', 'p', 'div', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table'}
 
-class GmailMonitor:
     def __init__(self):
-        # MongoDB setup
-        self.client = MongoClient(MONGODB_URI)
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.chunks.append(data)
+
+    def get_text(self):
+        lines = (' '.join(line.split()) for line in ''.join(self.chunks).splitlines())
+        return '\n'.join(line for line in lines if line)
+
+def html_to_text(html):
+    parser = HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
+
+class GmailMonitor:
+    def __init__(self, account_id=None, token_path=GMAIL_TOKEN, client=None):
+        # Accounts polled by a pool share the pool's MongoDB client
+        self.account_id = account_id
+        self.owns_client = client is None
+        self.client = client or MongoClient(MONGODB_URI, tz_aware=True)
         self.db = self.client['email_db']
         self.emails = self.db['emails']
         self.metadata = self.db['metadata']
+        # Per-message processing state: fetched -> analyzed -> stored, or failed awaiting retry
+        self.message_states = self.db['message_states']
+        self.emails.create_index([('message_id', 1), ('account_id', 1)])
+        self.message_states.create_index([('account_id', 1), ('status', 1), ('next_retry_at', 1)])
         
         # Gmail API setup
         self.SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+        self.token_path = token_path
+        self.rate_limiter = RateLimiter(API_RATE_LIMIT)
+        # Credentials and service are cached for the lifetime of the process
+        self.creds = None
+        self.service = None
+
+        # Set by push notifications to cut the current wait short
+        self.wake_event = threading.Event()
+        self.watch_expiration = None
         
         # Initialize last check timestamp
         self.initialize_timestamp()
@@ -36,59 +208,96 @@ class GmailMonitor:
         # Analysis endpoint
         self.ANALYSIS_ENDPOINT = 'http://127.0.0.1:5009/analyze_email'
 
+    @property
+    def cursor_id(self):
+        """Id of this account's cursor document in the metadata collection"""
+        if self.account_id is None:
+            return 'last_check'
+        return f'last_check:{self.account_id}'
+
     def initialize_timestamp(self):
         """Initialize or get the last check timestamp from MongoDB"""
-        timestamp_doc = self.metadata.find_one({'_id': 'last_check'})
+        timestamp_doc = self.metadata.find_one({'_id': self.cursor_id})
         if not timestamp_doc:
             # Start from 24 hours ago if no timestamp exists
             initial_timestamp = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
             self.metadata.insert_one({
-                '_id': 'last_check',
+                '_id': self.cursor_id,
                 'timestamp': initial_timestamp
             })
             self.last_check_time = initial_timestamp
         else:
             self.last_check_time = timestamp_doc['timestamp']
 
-    def update_timestamp(self):
-        """Update the last check timestamp in MongoDB"""
-        current_time = datetime.datetime.now(datetime.timezone.utc)
+    def update_timestamp(self, timestamp):
+        """Advance the last check timestamp in MongoDB"""
         self.metadata.update_one(
-            {'_id': 'last_check'},
-            {'$set': {'timestamp': current_time}},
+            {'_id': self.cursor_id},
+            {'$set': {'timestamp': timestamp}},
             upsert=True
         )
-        self.last_check_time = current_time
+        self.last_check_time = timestamp
 
-    def get_gmail_service(self):
+    def load_credentials(self):
+        """Load credentials from the token file, running the OAuth flow if needed"""
         creds = None
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
                 creds = pickle.load(token)
         
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
+            elif self.account_id is not None:
+                # Pooled accounts cannot open a browser for consent
+                raise RuntimeError(f"No valid token for account {self.account_id}")
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(
                     GMAIL_CREDENTIALS, self.SCOPES)
                 creds = flow.run_local_server(port=0)
-            
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
+            self.save_credentials(creds)
 
-        return build('gmail', 'v1', credentials=creds)
+        return creds
 
-    def get_email_analysis(self, email_content, sender_email):
-        print("Getting email analysis...")
-        print(email_content, sender_email)
+    def save_credentials(self, creds):
+        """Persist credentials so a restart does not need a new OAuth flow"""
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def credentials_expiring(self):
+        """Check whether the cached credentials expire within the refresh margin"""
+        if not self.creds.valid:
+            return True
+        if not self.creds.expiry:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return self.creds.expiry - now < datetime.timedelta(seconds=TOKEN_REFRESH_MARGIN)
+
+    def get_gmail_service(self):
+        """Return the cached Gmail service, refreshing credentials before they expire"""
+        if self.service is None:
+            self.creds = self.load_credentials()
+            # Use the discovery document bundled with the client library instead of fetching it
+            self.service = build('gmail', 'v1', credentials=self.creds,
+                                 static_discovery=True, cache_discovery=False)
+        elif self.credentials_expiring() and self.creds.refresh_token:
+            # Refreshing in place updates the credentials held by the service's http
+            self.creds.refresh(Request())
+            self.save_credentials(self.creds)
+
+        return self.service
+
+    def get_email_analysis(self, email_content, sender_email, headers=None):
+        print(f"Getting email analysis for {sender_email} ({len(email_content)} chars)...")
         """Get email analysis from the analysis service"""
         try:
             response = requests.post(
                 self.ANALYSIS_ENDPOINT,
                 json={
                     "email_content": email_content,
-                    "sender_email": sender_email
+                    "sender_email": sender_email,
+                    "headers": headers or {}
                 }
             )
             if response.status_code == 200:
@@ -99,115 +308,368 @@ class GmailMonitor:
             print(f"Error getting email analysis: {str(e)}")
             return None
 
+    def iter_body_parts(self, payload):
+        """Yield the text parts worth reading, choosing one part per multipart/alternative"""
+        mime_type = payload.get('mimeType', '')
+        body = payload.get('body', {})
+
+        # Attachments are skipped without downloading or decoding them
+        if payload.get('filename') or 'attachmentId' in body:
+            return
+
+        parts = payload.get('parts')
+        if parts:
+            if mime_type == 'multipart/alternative':
+                # Prefer plain text, then nested multiparts, and only fall back to HTML
+                rank = {'text/plain': 0, 'text/html': 2}
+                best = min(parts, key=lambda part: rank.get(part.get('mimeType', ''), 1))
+                yield from self.iter_body_parts(best)
+            else:
+                for part in parts:
+                    yield from self.iter_body_parts(part)
+        elif 'data' in body and (not mime_type or mime_type.startswith('text/')):
+            yield payload
+
+    def decode_part(self, part, max_bytes):
+        """Decode at most max_bytes of a base64url encoded part body"""
+        data = part['body']['data']
+        # Every 4 base64 characters encode 3 bytes, so only a prefix has to be decoded
+        data = data[:-(-max_bytes // 3) * 4]
+        data += '=' * (-len(data) % 4)
+        return base64.urlsafe_b64decode(data.encode('UTF-8')).decode('utf-8', errors='replace')
+
     def extract_email_body(self, payload):
-        """Extract email body recursively from payload parts"""
+        """Extract the readable email body, capped at MAX_BODY_CHARS"""
         if not payload:
             return ""
 
-        body = ""
-        
-        # If this part has a body with data, decode it
-        if 'body' in payload and 'data' in payload['body']:
+        chunks = []
+        remaining = MAX_BODY_CHARS
+        for part in self.iter_body_parts(payload):
             try:
-                body += base64.urlsafe_b64decode(payload['body']['data'].encode('UTF-8')).decode('utf-8', errors='replace')
+                if part.get('mimeType') == 'text/html':
+                    text = html_to_text(self.decode_part(part, MAX_HTML_BYTES))
+                else:
+                    # UTF-8 needs at most 4 bytes per character
+                    text = self.decode_part(part, remaining * 4)
             except Exception as e:
                 print(f"Error decoding body: {str(e)}")
+                continue
+
+            text = text[:remaining]
+            chunks.append(text)
+            remaining -= len(text)
+            if remaining <= 0:
+                break
 
-        # If this part has sub-parts, process them recursively
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part.get('mimeType', '').startswith('text/'):
-                    body += self.extract_email_body(part)
-                elif part.get('parts'):  # Handle nested multipart messages
-                    body += self.extract_email_body(part)
+        return '\n'.join(chunks)
 
-        return body
+    def start_watch(self):
+        """Ask Gmail to publish mailbox changes to PUSH_TOPIC"""
+        service = self.get_gmail_service()
+        self.rate_limiter.acquire()
+        response = service.users().watch(
+            userId='me',
+            body={'topicName': PUSH_TOPIC, 'labelIds': ['INBOX']}
+        ).execute()
+        # Expiration is in milliseconds since epoch
+        self.watch_expiration = int(response['expiration']) / 1000
+        print(f"Gmail watch active until {datetime.datetime.fromtimestamp(self.watch_expiration)}")
+
+    def renew_watch_if_needed(self):
+        if self.watch_expiration and self.watch_expiration - time.time() < WATCH_RENEW_MARGIN:
+            try:
+                self.start_watch()
+            except Exception as e:
+                print(f"Error renewing Gmail watch: {str(e)}")
+
+    def handle_push(self, notification):
+        print(f"Push notification received (historyId: {notification.get('historyId')})")
+        self.wake_event.set()
+
+    def state_id(self, message_id):
+        return f"{self.account_id or 'default'}:{message_id}"
+
+    def set_message_state(self, message_id, status, **fields):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.message_states.update_one(
+            {'_id': self.state_id(message_id)},
+            {
+                '$set': {'status': status, 'updated_at': now, **fields},
+                '$setOnInsert': {'account_id': self.account_id, 'message_id': message_id}
+            },
+            upsert=True
+        )
+
+    def list_message_ids(self, service, query):
+        """List every message id matching the query, following pagination"""
+        message_ids = []
+        page_token = None
+        while True:
+            self.rate_limiter.acquire()
+            results = service.users().messages().list(
+                userId='me',
+                q=query,
+                pageToken=page_token
+            ).execute()
+            message_ids.extend(message['id'] for message in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return message_ids
+
+    def process_message(self, service, message_id, state=None):
+        """
+        Move one message through fetched -> analyzed -> stored.
+
+        Each step is recorded in message_states so a restart resumes where it stopped
+        instead of re-running the analysis. Gmail API errors propagate to abort the cycle.
+
+        Returns:
+            tuple: (stored, received_at) where stored is False if the message needs a retry
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if state is None:
+            state = self.message_states.find_one({'_id': self.state_id(message_id)}) or {}
+        if state.get('status') == 'stored':
+            return True, state.get('received_at')
+        if state.get('status') == 'failed' and state['next_retry_at'] > now:
+            return False, state.get('received_at')
+
+        self.rate_limiter.acquire()
+        msg = service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='full'
+        ).execute()
+        
+        # Extract email details
+        headers = msg['payload']['headers']
+        subject = next(
+            (header['value'] for header in headers if header['name'].lower() == 'subject'),
+            'No Subject'
+        )
+        sender = next(
+            (header['value'] for header in headers if header['name'].lower() == 'from'),
+            'No Sender'
+        )
+        
+        # Get internal date from the email (in milliseconds since epoch)
+        received_date = datetime.datetime.fromtimestamp(
+            int(msg['internalDate']) / 1000,
+            tz=datetime.timezone.utc
+        )
+        
+        # Extract full email content using the new method
+        full_body = self.extract_email_body(msg['payload'])
+        
+        # Debug print
+        print("Extracted email body:", full_body[:200], "...")  # Print first 200 chars
+        
+        # Reuse an analysis that finished before a crash instead of paying for it again
+        if state.get('status') == 'analyzed':
+            analysis_result = state['analysis']
+        else:
+            if not state:
+                self.set_message_state(message_id, 'fetched', received_at=received_date, attempts=0)
+            bulk_headers = {
+                header['name']: header['value']
+                for header in headers if header['name'].lower() in BULK_HEADERS
+            }
+            analysis_result = self.get_email_analysis(full_body, sender, bulk_headers)
+            if analysis_result is None:
+                attempts = state.get('attempts', 0) + 1
+                if attempts < MAX_ANALYSIS_ATTEMPTS:
+                    next_retry_at = now + datetime.timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1))
+                    self.set_message_state(message_id, 'failed', received_at=received_date,
+                                           attempts=attempts, next_retry_at=next_retry_at)
+                    print(f"Analysis failed for {subject}, retry {attempts} at {next_retry_at}")
+                    return False, received_date
+                # Give up on the analysis so the cursor is not blocked forever
+                print(f"Analysis failed {attempts} times for {subject}, storing without analysis")
+            else:
+                self.set_message_state(message_id, 'analyzed', analysis=analysis_result)
+        
+        # Upsert so a crash between storing and marking the state stored cannot duplicate the email
+        # Message ids are only unique per mailbox; single-account docs have no account_id
+        email_doc = {
+            'message_id': message_id,
+            'account_id': self.account_id,
+            'subject': subject,
+            'sender': sender,
+            'received_at': received_date,
+            'stored_at': datetime.datetime.now(datetime.timezone.utc),
+            'snippet': msg.get('snippet', ''),
+            'labels': msg.get('labelIds', []),
+            'full_body': full_body,  # Store as full_body instead of body
+            'analysis': analysis_result  # Add the analysis result
+        }
+        self.emails.update_one(
+            {'message_id': message_id, 'account_id': self.account_id},
+            {'$setOnInsert': email_doc},
+            upsert=True
+        )
+        self.set_message_state(message_id, 'stored', received_at=received_date, analysis=None)
+        print(f"New email stored with analysis: {subject}")
+        return True, received_date
+
+    def retry_failed_analyses(self, service):
+        """Retry due messages from the retry queue, returning how many were stored"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        due = self.message_states.find({
+            'account_id': self.account_id,
+            'status': 'failed',
+            'next_retry_at': {'$lte': now}
+        })
+        stored = 0
+        for state in due:
+            done, _ = self.process_message(service, state['message_id'], state)
+            stored += done
+        return stored
 
     def fetch_new_emails(self):
+        """Fetch, analyze and store new emails, returning how many were stored"""
+        stored = 0
         try:
             service = self.get_gmail_service()
+            stored += self.retry_failed_analyses(service)
             
             # Convert timestamp to Gmail's query format
             # Gmail API uses seconds since epoch for comparison
             after_timestamp = int(self.last_check_time.timestamp())
             query = f'after:{after_timestamp}'
             
-            results = service.users().messages().list(
-                userId='me',
-                q=query
-            ).execute()
-            
-            messages = results.get('messages', [])
+            # Gmail lists newest first; process oldest first so the cursor can follow along
+            message_ids = self.list_message_ids(service, query)
+            newest_done = None
+            oldest_pending = None
+            for message_id in reversed(message_ids):
+                state = self.message_states.find_one({'_id': self.state_id(message_id)}) or {}
+                was_stored = state.get('status') == 'stored'
+                done, received_at = self.process_message(service, message_id, state)
+                if done:
+                    stored += not was_stored
+                    if received_at and (newest_done is None or received_at > newest_done):
+                        newest_done = received_at
+                elif received_at and (oldest_pending is None or received_at < oldest_pending):
+                    oldest_pending = received_at
             
-            for message in messages:
-                msg = service.users().messages().get(
-                    userId='me',
-                    id=message['id'],
-                    format='full'
-                ).execute()
-                
-                # Extract email details
-                headers = msg['payload']['headers']
-                subject = next(
-                    (header['value'] for header in headers if header['name'].lower() == 'subject'),
-                    'No Subject'
-                )
-                sender = next(
-                    (header['value'] for header in headers if header['name'].lower() == 'from'),
-                    'No Sender'
-                )
-                
-                # Get internal date from the email (in milliseconds since epoch)
-                received_date = datetime.datetime.fromtimestamp(
-                    int(msg['internalDate']) / 1000,
-                    tz=datetime.timezone.utc
-                )
-                
-                # Extract full email content using the new method
-                full_body = self.extract_email_body(msg['payload'])
-                
-                # Debug print
-                print("Extracted email body:", full_body[:200], "...")  # Print first 200 chars
-                
-                # Get email analysis before storing
-                print(full_body, sender)
-                analysis_result = self.get_email_analysis(full_body, sender)
-                
-                # Store only if not already in database
-                if not self.emails.find_one({'message_id': message['id']}):
-                    email_doc = {
-                        'message_id': message['id'],
-                        'subject': subject,
-                        'sender': sender,
-                        'received_at': received_date,
-                        'stored_at': datetime.datetime.now(datetime.timezone.utc),
-                        'snippet': msg.get('snippet', ''),
-                        'labels': msg.get('labelIds', []),
-                        'full_body': full_body,  # Store as full_body instead of body
-                        'analysis': analysis_result  # Add the analysis result
-                    }
-                    self.emails.insert_one(email_doc)
-                    print(f"New email stored with analysis: {subject}")
-            
-            # Update the timestamp after successful fetch
-            self.update_timestamp()
+            # Only move the cursor past messages that are fully processed
+            if oldest_pending is not None:
+                cursor = oldest_pending - datetime.timedelta(seconds=1)
+            else:
+                cursor = newest_done
+            if cursor is not None and cursor > self.last_check_time:
+                self.update_timestamp(cursor)
             
         except Exception as e:
-            print(f"Error fetching emails: {str(e)}")
+            # The cursor is left where it was; stored messages are skipped on the next pass
+            print(f"Error fetching emails for {self.account_id or 'default account'}: {str(e)}")
+
+        return stored
 
     def run(self):
         print("Gmail monitor started. Press Ctrl+C to stop.")
+        interval = AdaptiveInterval()
+        push_server = None
+        if PUSH_TOPIC:
+            # Polling continues at the backed-off interval as a fallback for missed pushes
+            push_server = start_push_server(self.handle_push)
+            self.start_watch()
         try:
             while True:
                 current_time = datetime.datetime.now(datetime.timezone.utc)
                 print(f"\nChecking for new emails at {current_time}")
                 print(f"Fetching emails since: {self.last_check_time}")
-                self.fetch_new_emails()
-                time.sleep(CHECK_INTERVAL)
+                # Cleared before fetching so a push arriving mid-cycle triggers another sync
+                self.wake_event.clear()
+                new_emails = self.fetch_new_emails()
+                if PUSH_TOPIC:
+                    self.renew_watch_if_needed()
+                wait = interval.update(new_emails)
+                print(f"Next check in {wait:.0f} seconds")
+                self.wake_event.wait(wait)
         except KeyboardInterrupt:
             print("\nStopping Gmail monitor...")
-            self.client.close()
+            if push_server:
+                push_server.shutdown()
+            if self.owns_client:
+                self.client.close()
+
+def shard_for(account_id, shard_count):
+    """Stable shard assignment so an account is always polled by the same process"""
+    digest = hashlib.sha1(account_id.encode('utf-8')).hexdigest()
+    return int(digest, 16) % shard_count
+
+class AccountPool:
+    """Polls every account of one shard with a pool of worker threads"""
+    def __init__(self, tokens_dir, shard_index=0, shard_count=1, workers=POLL_WORKERS):
+        self.tokens_dir = tokens_dir
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.workers = workers
+        self.monitors = {}
+
+    def discover_accounts(self):
+        """Return {account_id: token_path} for the accounts owned by this shard"""
+        accounts = {}
+        for name in sorted(os.listdir(self.tokens_dir)):
+            account_id, ext = os.path.splitext(name)
+            if ext != '.pickle':
+                continue
+            if shard_for(account_id, self.shard_count) == self.shard_index:
+                accounts[account_id] = os.path.join(self.tokens_dir, name)
+        return accounts
+
+    def sync_monitors(self, client):
+        """Create monitors for new token files and drop removed accounts"""
+        accounts = self.discover_accounts()
+        for account_id in list(self.monitors):
+            if account_id not in accounts:
+                del self.monitors[account_id]
+        for account_id, token_path in accounts.items():
+            if account_id not in self.monitors:
+                self.monitors[account_id] = GmailMonitor(account_id, token_path, client)
+
+    def run(self):
+        print(f"Shard {self.shard_index}/{self.shard_count} started with {self.workers} workers.")
+        # Created here so that each shard process opens its own connection after fork
+        client = MongoClient(MONGODB_URI, tz_aware=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while True:
+                    self.sync_monitors(client)
+                    print(f"Shard {self.shard_index}: polling {len(self.monitors)} accounts")
+                    # fetch_new_emails handles its own errors, so list() only waits for the cycle
+                    list(executor.map(lambda monitor: monitor.fetch_new_emails(), self.monitors.values()))
+                    time.sleep(CHECK_INTERVAL)
+        except KeyboardInterrupt:
+            print(f"\nStopping shard {self.shard_index}...")
+        finally:
+            client.close()
+
+def run_shard(shard_index, shard_count):
+    AccountPool(GMAIL_TOKENS_DIR, shard_index, shard_count).run()
+
+def run_all_shards():
+    """Spawn one process per shard and wait for them"""
+    processes = [
+        multiprocessing.Process(target=run_shard, args=(index, SHARD_COUNT))
+        for index in range(SHARD_COUNT)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
 
 if __name__ == "__main__":
-    monitor = GmailMonitor()
-    monitor.run()
\ No newline at end of file
+    if not GMAIL_TOKENS_DIR:
+        monitor = GmailMonitor()
+        monitor.run()
+    elif SHARD_INDEX is not None:
+        run_shard(int(SHARD_INDEX), SHARD_COUNT)
+    else:
+        run_all_shards()
\ No newline at end of file
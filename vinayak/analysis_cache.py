@@ -0,0 +1,151 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+def normalize_email_content(email_content):
+    """Collapse whitespace so re-wrapped copies of the same email hash alike"""
+    return ' '.join(email_content.split())
+
+
+def analysis_cache_key(email_content, sender_email, prompt_version, mode=''):
+    """Hash of the normalized content, sender and prompt version identifying an analysis"""
+    parts = [
+        str(prompt_version),
+        mode,
+        (sender_email or '').strip().lower(),
+        normalize_email_content(email_content)
+    ]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+class SQLiteStore:
+    """Persistent cache tier backed by a local SQLite file"""
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT value FROM analysis_cache WHERE key = ? AND expires_at > ?',
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time() + ttl)
+            )
+            self.conn.commit()
+
+
+class MongoStore:
+    """Persistent cache tier backed by a MongoDB collection with a TTL index"""
+    def __init__(self, uri, db_name='email_analysis', collection_name='analysis_cache'):
+        from pymongo import MongoClient
+        self.collection = MongoClient(uri, tz_aware=True)[db_name][collection_name]
+        # MongoDB removes expired entries in the background
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def get(self, key):
+        doc = self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.now(timezone.utc)}})
+        return json.loads(doc['value']) if doc else None
+
+    def set(self, key, value, ttl):
+        self.collection.replace_one(
+            {'_id': key},
+            {
+                '_id': key,
+                'value': json.dumps(value),
+                'expires_at': datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            },
+            upsert=True
+        )
+
+
+def create_store(url):
+    """Build a persistent tier from 'sqlite:///path/to/file.db' or a mongodb:// URI"""
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    if url.startswith(('mongodb://', 'mongodb+srv://')):
+        return MongoStore(url)
+    raise ValueError(f"Unsupported analysis cache store: {url}")
+
+
+class AnalysisCache:
+    """Two-tier cache of email analyses: an in-memory LRU in front of an optional persistent store"""
+    def __init__(self, max_entries=1024, ttl=86400, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'store_hits': 0, 'misses': 0, 'store_errors': 0}
+
+    def get(self, key):
+        """Return a copy of the cached analysis, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > time.time():
+                self.entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return copy.deepcopy(entry[0])
+            if entry:
+                del self.entries[key]
+
+        value = None
+        if self.store:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                print(f"Analysis cache store read failed: {str(e)}")
+                self.stats['store_errors'] += 1
+
+        with self.lock:
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['store_hits'] += 1
+            self._remember(key, value)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self.lock:
+            self._remember(key, value)
+        if self.store:
+            try:
+                self.store.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"Analysis cache store write failed: {str(e)}")
+                self.stats['store_errors'] += 1
+
+    def _remember(self, key, value):
+        self.entries[key] = (value, time.time() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.entries)
+        lookups = stats['memory_hits'] + stats['store_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['store_hits']) / lookups if lookups else 0.0
+        return stats
@@ -1,36 +1,337 @@
 from flask import Blueprint, request, jsonify, Flask
-import google.generativeai as genai
 from datetime import datetime
 import os
+import sys
 import json
+import asyncio
+from pathlib import Path
+import contextvars
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
 from dotenv import load_dotenv
 from flask_cors import CORS
+from analysis_cache import AnalysisCache, analysis_cache_key, create_store
+from prefilter import BulkMailFilter
+from llm_json import ParseStats, conform, parse_json_object
+from email_text import estimate_tokens, split_into_chunks, strip_quoted_replies, truncate_to_budget
+
+# Shared modules live at the repository root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.llm_client import LLM_BACKEND, get_llm_client
+from common.llm_metrics import instrument_flask_app, metrics, submit_with_context
 
 # Load environment variables
 load_dotenv()
 
+# Warmup issues one real analysis per worker at startup so the first request does not pay for connection setup
+WARMUP_CALL = os.getenv('WARMUP_CALL', 'false').lower() == 'true'
+
 # Get API key from environment variables - NEVER hardcode API keys
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and LLM_BACKEND == 'gemini':
     raise ValueError("GOOGLE_API_KEY environment variable is not set")
 
+# Schema-constrained JSON output needs a Gemini 1.5+ model
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+# 'single' extracts everything in one call, 'multi' keeps the original three-call flow for comparison
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'single')
+ANALYSIS_MODES = ('single', 'multi')
+# Timeout in seconds for each Gemini call, and the pool running independent calls concurrently
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', 16))
+# How long a call may wait for a free llm_executor worker before it is given up
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', LLM_TIMEOUT))
+# Bump whenever the prompts or schema change so stale cached analyses are not served
+PROMPT_VERSION = 2
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 1024))
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', 86400))
+ANALYSIS_CACHE_STORE = os.getenv('ANALYSIS_CACHE_STORE')  # sqlite:///path.db or mongodb://...
+# High-confidence bulk mail is answered locally instead of by Gemini
+PREFILTER_ENABLED = os.getenv('PREFILTER_ENABLED', 'true').lower() == 'true'
+PREFILTER_THRESHOLD = float(os.getenv('PREFILTER_THRESHOLD', 0.85))
+# Long emails: quoted history is stripped, then content over EMAIL_TOKEN_BUDGET is either
+# truncated or split into at most MAX_CHUNKS chunks analyzed concurrently and merged
+STRIP_QUOTED_REPLIES = os.getenv('STRIP_QUOTED_REPLIES', 'true').lower() == 'true'
+EMAIL_TOKEN_BUDGET = int(os.getenv('EMAIL_TOKEN_BUDGET', 4000))
+LONG_EMAIL_STRATEGY = os.getenv('LONG_EMAIL_STRATEGY', 'map_reduce')  # or 'truncate'
+MAX_CHUNKS = int(os.getenv('MAX_CHUNKS', 4))
+# /analyze_emails: emails up to PACK_MAX_CHARS are analyzed PACK_SIZE at a time in one call
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 100))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+PACK_MAX_CHARS = int(os.getenv('PACK_MAX_CHARS', 2000))
+PACK_SIZE = int(os.getenv('PACK_SIZE', 5))
+
 # Initialize Blueprint
 executive_agent = Blueprint('executive_agent', __name__)
-# Configure Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-pro')
+llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix='llm')
+# Separate from llm_executor so batch jobs waiting on sub-calls cannot starve the pool they wait on
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL, create_store(ANALYSIS_CACHE_STORE))
+bulk_filter = BulkMailFilter(PREFILTER_THRESHOLD)
+parse_stats = ParseStats()
+
+def get_llm():
+    # Created on first use rather than at import, so forked workers each build their own client
+    return get_llm_client(GEMINI_MODEL, GOOGLE_API_KEY)
+
+def _string_list():
+    return {"type": "ARRAY", "items": {"type": "STRING"}}
+
+MEETING_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "date": {"type": "STRING"},
+        "time": {"type": "STRING"},
+        "duration": {"type": "STRING"},
+        "location": {"type": "STRING"},
+        "participants": _string_list()
+    }
+}
+
+TASK_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "due_date": {"type": "STRING"}
+    },
+    "required": ["name"]
+}
+
+# Response schema for the single-call analysis
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "nlp_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "key_topics": _string_list(),
+                "named_entities": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "people": _string_list(),
+                        "organizations": _string_list(),
+                        "locations": _string_list()
+                    }
+                },
+                "tone": {"type": "STRING"},
+                "action_items": _string_list(),
+                "important_dates": _string_list()
+            }
+        },
+        "priority_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "priority_score": {"type": "NUMBER"},
+                "priority_reasons": _string_list()
+            },
+            "required": ["priority_score"]
+        },
+        "content_segments": {
+            "type": "OBJECT",
+            "properties": {
+                "tasks": _string_list(),
+                "calendar": _string_list(),
+                "others": _string_list()
+            }
+        },
+        "spam_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "spam_score": {"type": "NUMBER"},
+                "spam_reasons": _string_list()
+            }
+        },
+        "authority_analysis": {
+            "type": "OBJECT",
+            "properties": {
+                "is_internal": {"type": "BOOLEAN"},
+                "authority_level": {"type": "STRING"},
+                "priority_multiplier": {"type": "NUMBER"},
+                "red_flags": _string_list()
+            },
+            "required": ["priority_multiplier"]
+        },
+        "calendar_meetings": {"type": "ARRAY", "items": MEETING_SCHEMA},
+        "notion_tasks": {"type": "ARRAY", "items": TASK_SCHEMA}
+    },
+    "required": ["nlp_analysis", "priority_analysis", "content_segments", "spam_analysis",
+                 "authority_analysis", "calendar_meetings", "notion_tasks"]
+}
+
+# Non-empty defaults used when a field is missing from the model's response
+ANALYSIS_DEFAULTS = {'authority_analysis': {'priority_multiplier': 1.0}}
+
+# Schemas the separate prompts of 'multi' mode are validated against
+MAIN_ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        name: prop for name, prop in ANALYSIS_SCHEMA["properties"].items()
+        if name not in ("calendar_meetings", "notion_tasks")
+    }
+}
+CALENDAR_SCHEMA = {"type": "OBJECT", "properties": {"meetings": {"type": "ARRAY", "items": MEETING_SCHEMA}}}
+TASKS_SCHEMA = {"type": "OBJECT", "properties": {"tasks": {"type": "ARRAY", "items": TASK_SCHEMA}}}
+
+# Response schema for several short emails packed into one call
+PACKED_ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "results": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"email_id": {"type": "STRING"}, **ANALYSIS_SCHEMA["properties"]},
+                "required": ["email_id", *ANALYSIS_SCHEMA["required"]]
+            }
+        }
+    },
+    "required": ["results"]
+}
 
 class EmailAnalyzer:
-    def __init__(self, email_content, sender_email=''):
+    def __init__(self, email_content, sender_email='', mode=ANALYSIS_MODE, strip_replies=STRIP_QUOTED_REPLIES):
         if not email_content:
             raise ValueError("Email content cannot be empty")
+        if mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode: {mode}")
+        if strip_replies:
+            email_content = strip_quoted_replies(email_content)
         self.email_content = email_content
         self.sender_email = sender_email
-        self.model = model
+        self.mode = mode
+        self.llm = get_llm()
     
     def analyze_email(self):
-        """Perform comprehensive email analysis in a single Gemini call"""
-        prompt = f"""
+        """Analyze the email with one schema-constrained call, or three calls in 'multi' mode"""
+        if estimate_tokens(self.email_content) > EMAIL_TOKEN_BUDGET:
+            if LONG_EMAIL_STRATEGY == 'map_reduce':
+                return self._analyze_map_reduce()
+            self.email_content = truncate_to_budget(self.email_content, EMAIL_TOKEN_BUDGET)
+        if self.mode == 'multi':
+            return self._analyze_multi_call()
+        return self._analyze_single_call()
+
+    def _analyze_map_reduce(self):
+        """Analyze chunks of a long email concurrently and merge the results"""
+        # Content beyond MAX_CHUNKS chunks is dropped from the middle to bound cost
+        content = truncate_to_budget(self.email_content, EMAIL_TOKEN_BUDGET * MAX_CHUNKS)
+        chunks = split_into_chunks(content, EMAIL_TOKEN_BUDGET)
+        if len(chunks) > MAX_CHUNKS:
+            # Paragraph boundaries can leave chunks short of the budget; keep the first ones and the last
+            chunks = chunks[:MAX_CHUNKS - 1] + chunks[-1:] if MAX_CHUNKS > 1 else chunks[:1]
+        # Chunks always use the single-call analysis: 'multi' would nest calls on llm_executor.
+        # Quoted replies were already stripped from the whole email.
+        futures = [
+            submit_with_context(
+                llm_executor,
+                EmailAnalyzer(chunk, self.sender_email, 'single', strip_replies=False)._analyze_single_call
+            )
+            for chunk in chunks
+        ]
+        # Chunk calls carry their own request timeout; the margin covers queueing
+        wait(futures, timeout=LLM_TIMEOUT * 2)
+
+        results, errors = [], {}
+        for index, future in enumerate(futures):
+            name = f"chunk_{index}"
+            if not future.done():
+                future.cancel()
+                errors[name] = "timed out"
+            elif future.exception() is not None:
+                errors[name] = str(future.exception())
+            else:
+                chunk_results = future.result()
+                for section, error in chunk_results.pop('analysis_errors', {}).items():
+                    errors[f"{name}_{section}"] = error
+                results.append(chunk_results)
+
+        analysis_results = self._merge_chunk_analyses(results)
+        analysis_results['chunk_count'] = len(chunks)
+        if errors:
+            analysis_results['analysis_errors'] = errors
+        return analysis_results
+
+    @staticmethod
+    def _merge_chunk_analyses(results):
+        """
+        Merge per-chunk analyses: lists are unioned, the priority score is the highest,
+        the spam score the lowest, and tone and authority come from the first chunk,
+        which holds the newest message and the sender's context.
+        """
+        if not results:
+            return conform(None, ANALYSIS_SCHEMA, ANALYSIS_DEFAULTS)[0]
+
+        def union(target, items):
+            seen = {json.dumps(item, sort_keys=True).lower() for item in target}
+            for item in items:
+                key = json.dumps(item, sort_keys=True).lower()
+                if key not in seen:
+                    seen.add(key)
+                    target.append(item)
+
+        merged = copy.deepcopy(results[0])
+        for other in results[1:]:
+            nlp = merged['nlp_analysis']
+            for field in ('key_topics', 'action_items', 'important_dates'):
+                union(nlp[field], other['nlp_analysis'][field])
+            for field, items in other['nlp_analysis']['named_entities'].items():
+                union(nlp['named_entities'].setdefault(field, []), items)
+            for field, items in other['content_segments'].items():
+                union(merged['content_segments'].setdefault(field, []), items)
+            union(merged['calendar_meetings'], other['calendar_meetings'])
+            union(merged['notion_tasks'], other['notion_tasks'])
+
+            priority = merged['priority_analysis']
+            priority['priority_score'] = max(priority['priority_score'],
+                                             other['priority_analysis']['priority_score'])
+            union(priority['priority_reasons'], other['priority_analysis']['priority_reasons'])
+
+            spam = merged['spam_analysis']
+            spam['spam_score'] = min(spam['spam_score'], other['spam_analysis']['spam_score'])
+            union(spam['spam_reasons'], other['spam_analysis']['spam_reasons'])
+
+            union(merged['authority_analysis']['red_flags'], other['authority_analysis']['red_flags'])
+        return merged
+
+    def _analyze_single_call(self):
+        """Extract every section, including meetings and tasks, from one Gemini call"""
+        response_text = self.llm.generate(
+            self._analysis_prompt(include_extractions=True), schema=ANALYSIS_SCHEMA, timeout=LLM_TIMEOUT
+        )
+        return self._single_call_results(response_text)
+
+    async def analyze_email_async(self):
+        """
+        Async variant of analyze_email. The common case, a single call on an email within
+        budget, awaits the model directly; other paths run analyze_email in a thread.
+        """
+        if self.mode != 'single' or estimate_tokens(self.email_content) > EMAIL_TOKEN_BUDGET:
+            return await asyncio.to_thread(self.analyze_email)
+        response_text = await self.llm.agenerate(
+            self._analysis_prompt(include_extractions=True), schema=ANALYSIS_SCHEMA, timeout=LLM_TIMEOUT
+        )
+        return self._single_call_results(response_text)
+
+    def _single_call_results(self, response_text):
+        analysis_results, parsed = self._parse_response(response_text, ANALYSIS_SCHEMA, ANALYSIS_DEFAULTS)
+        if not parsed:
+            analysis_results['analysis_errors'] = {'main': 'unparseable response'}
+        return analysis_results
+
+    def _analysis_prompt(self, include_extractions=False):
+        extra_fields = ""
+        extractions = ""
+        if include_extractions:
+            extra_fields = ',\n            "calendar_meetings": [],\n            "notion_tasks": []'
+            extractions = """
+        Also fill "calendar_meetings" with every meeting mentioned in the email and "notion_tasks" with
+        every task, each task having a "name" (task description) and an optional "due_date".
+        """
+        return f"""
         Analyze this email comprehensively and return ONLY a JSON object with the following structure:
         
         Remember this carefully !!
@@ -66,18 +367,62 @@ class EmailAnalyzer:
                 "authority_level": "",
                 "priority_multiplier": 1.0,
                 "red_flags": []
-            }}
+            }}{extra_fields}
         }}
-        
+        {extractions}
         Fill in the above structure based on analyzing this email content: {self.email_content}
         For the sender email: {self.sender_email}
 
         Important: Return ONLY the JSON object with no additional text, markdown formatting, or explanation.
         """
-        
-        response = self.model.generate_content(prompt)
-        analysis_results = self._parse_response(response)
-        
+
+    def _generate_concurrently(self, prompts):
+        """
+        Run independent prompts in parallel on llm_executor.
+
+        Each call gets LLM_TIMEOUT from the moment it starts running, not from when it
+        was queued; a call still waiting for a free worker after LLM_QUEUE_TIMEOUT is
+        cancelled instead.
+
+        Args:
+            prompts (dict): name -> (prompt, response schema)
+
+        Returns:
+            tuple: (response texts, errors) keyed by prompt name; failed calls only appear in errors
+        """
+        started_at = {}
+        started = {name: threading.Event() for name in prompts}
+
+        def run(name, prompt, schema):
+            started_at[name] = time.monotonic()
+            started[name].set()
+            return self.llm.generate(prompt, schema=schema, timeout=LLM_TIMEOUT)
+
+        futures = {
+            name: submit_with_context(llm_executor, run, name, prompt, schema)
+            for name, (prompt, schema) in prompts.items()
+        }
+        queue_deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+
+        responses, errors = {}, {}
+        for name, future in futures.items():
+            if not started[name].wait(max(queue_deadline - time.monotonic(), 0)) and future.cancel():
+                errors[name] = f"not started within {LLM_QUEUE_TIMEOUT:.0f}s"
+                continue
+            # cancel() fails once the call is running, so it is about to record its start
+            started[name].wait()
+            try:
+                responses[name] = future.result(timeout=max(started_at[name] + LLM_TIMEOUT - time.monotonic(), 0))
+            except FuturesTimeout:
+                errors[name] = f"timed out after {LLM_TIMEOUT:.0f}s"
+            except Exception as e:
+                errors[name] = str(e)
+        for name, error in errors.items():
+            print(f"{name} analysis failed: {error}")
+        return responses, errors
+
+    def _analyze_multi_call(self):
+        """Original flow with analysis, calendar and tasks prompts issued concurrently"""
         # Modified calendar meetings prompt to enforce JSON structure
         calendar_prompt = f"""
         Extract all calendar meetings from this email and return them in this exact JSON format:
@@ -106,51 +451,327 @@ class EmailAnalyzer:
         Return ONLY the JSON object.
         """
         
-        calendar_response = self.model.generate_content(calendar_prompt)
-        tasks_response = self.model.generate_content(tasks_prompt)
-        
-        # Parse calendar meetings with better error handling
-        calendar_data = self._parse_response(calendar_response)
-        if isinstance(calendar_data, dict) and 'meetings' in calendar_data:
-            analysis_results['calendar_meetings'] = calendar_data['meetings']
-        else:
-            analysis_results['calendar_meetings'] = []
+        responses, errors = self._generate_concurrently({
+            'main': (self._analysis_prompt(), MAIN_ANALYSIS_SCHEMA),
+            'calendar': (calendar_prompt, CALENDAR_SCHEMA),
+            'tasks': (tasks_prompt, TASKS_SCHEMA)
+        })
 
-        # Parse tasks with better error handling
-        tasks_data = self._parse_response(tasks_response)
-        if isinstance(tasks_data, dict) and 'tasks' in tasks_data:
-            analysis_results['notion_tasks'] = tasks_data['tasks']
-        else:
-            analysis_results['notion_tasks'] = []
+        # A failed sub-analysis leaves its section at the schema defaults instead of failing the whole email
+        sections = {}
+        for name, schema, defaults in (('main', MAIN_ANALYSIS_SCHEMA, ANALYSIS_DEFAULTS),
+                                       ('calendar', CALENDAR_SCHEMA, None),
+                                       ('tasks', TASKS_SCHEMA, None)):
+            if name in responses:
+                sections[name], parsed = self._parse_response(responses[name], schema, defaults)
+                if not parsed:
+                    errors[name] = 'unparseable response'
+            else:
+                sections[name] = conform(None, schema, defaults)[0]
+
+        analysis_results = sections['main']
+        analysis_results['calendar_meetings'] = sections['calendar']['meetings']
+        analysis_results['notion_tasks'] = sections['tasks']['tasks']
+
+        if errors:
+            analysis_results['analysis_errors'] = errors
         
         return analysis_results
     
-    def _parse_response(self, response):
-        """Parse the response from the model and handle errors."""
+    @staticmethod
+    def analyze_packed(emails):
+        """
+        Analyze several short emails with one schema-constrained call.
+
+        Args:
+            emails (list): (email_content, sender_email) tuples
+
+        Returns:
+            dict: index in emails -> analysis results, missing entries the model skipped
+        """
+        sections = "\n".join(
+            f"""
+        --- Email id: {index} ---
+        Sender: {sender_email}
+        Content: {email_content}
+        """
+            for index, (email_content, sender_email) in enumerate(emails)
+        )
+        prompt = f"""
+        Analyze each of the following emails independently. Return ONLY a JSON object of the form
+        {{"results": [...]}} with one entry per email, each carrying its "email_id" and the full analysis:
+        nlp_analysis, priority_analysis, content_segments, spam_analysis, authority_analysis,
+        calendar_meetings (every meeting mentioned) and notion_tasks (every task with a "name" and optional "due_date").
+
+        Remember this carefully !!
+        If a mail mentions anything about a meeting then include it in the calendar segment and exclude it from the tasks segment.
+        {sections}
+        """
+        response_text = get_llm().generate(prompt, schema=PACKED_ANALYSIS_SCHEMA, timeout=LLM_TIMEOUT)
+        # Entries are validated one by one so a single malformed entry only costs its own email
+        parsed, _ = EmailAnalyzer._parse_response(
+            response_text, {"type": "OBJECT", "properties": {"results": {"type": "ARRAY"}}}
+        )
+
+        results = {}
+        for entry in parsed['results']:
+            try:
+                index = int(entry.pop('email_id'))
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(emails):
+                results[index] = conform(entry, ANALYSIS_SCHEMA, ANALYSIS_DEFAULTS)[0]
+        return results
+
+    @staticmethod
+    def _parse_response(response_text, schema, defaults=None):
+        """
+        Parse the model's response text into data conforming to schema.
+
+        The first balanced JSON object is extracted from the text and truncated output is
+        repaired where possible; missing or mistyped fields get their schema defaults.
+
+        Returns:
+            tuple: (data, parsed) where parsed is False if only defaults could be returned
+        """
         try:
-            # Get the raw text content from the response
-            response_text = response.text
-            
-            # Remove any potential markdown code block indicators
-            cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-            
-            # If the cleaned text is empty or indicates no data, return empty structure
-            if not cleaned_text or "no calendar meeting" in cleaned_text.lower():
-                return {"meetings": []}
-            
-            # Try to parse the JSON
-            return json.loads(cleaned_text)
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {str(e)} for text: {response_text}")
-            return {"meetings": []}
+            data, repaired = parse_json_object(response_text)
+        except Exception as e:
+            print(f"LLM response parsing error: {str(e)}")
+            parse_stats.record('failed')
+            return conform(None, schema, defaults)[0], False
+
+        data, fixes = conform(data, schema, defaults)
+        parse_stats.record('repaired' if repaired else 'parsed', fixes)
+        return data, True
+
+def prefilter(email_content, sender_email, headers, mode):
+    """Return the local analysis for obvious bulk mail, or None when the LLM is needed"""
+    if not PREFILTER_ENABLED:
+        return None
+    analysis_results = bulk_filter.check(email_content, sender_email, headers, 1 if mode == 'single' else 3)
+    if analysis_results is not None:
+        metrics.record_cache_lookup('prefiltered')
+    return analysis_results
+
+def cached_analysis(key):
+    """Look up the analysis cache, counting the outcome in the LLM metrics"""
+    analysis_results = analysis_cache.get(key)
+    metrics.record_cache_lookup('miss' if analysis_results is None else 'hit')
+    return analysis_results
+
+def lookup_analysis(email_content, sender_email, mode, headers):
+    """
+    Answer from the bulk mail prefilter or the analysis cache when possible.
+
+    Returns:
+        tuple: (analysis_results or None on a miss, cached, cache key)
+    """
+    prefiltered = prefilter(email_content, sender_email, headers, mode)
+    if prefiltered is not None:
+        return prefiltered, False, None
+    key = analysis_cache_key(email_content, sender_email, PROMPT_VERSION, mode)
+    return cached_analysis(key), True, key
+
+def analyze_with_cache(email_content, sender_email='', mode=ANALYSIS_MODE, headers=None):
+    """
+    Analyze an email, skipping obvious bulk mail and serving repeated content from the analysis cache.
+
+    Returns:
+        tuple: (analysis_results, cached)
+    """
+    analyzer = EmailAnalyzer(email_content, sender_email, mode)
+    analysis_results, cached, key = lookup_analysis(email_content, sender_email, mode, headers)
+    if analysis_results is not None:
+        return analysis_results, cached
+
+    analysis_results = analyzer.analyze_email()
+    cache_analysis(key, analysis_results)
+    return analysis_results, False
+
+_async_loop = None
+_async_loop_lock = threading.Lock()
+
+def get_async_loop():
+    """
+    Event loop that every async LLM call in this process runs on, started on first use.
+
+    grpc.aio clients stay bound to the loop they were first used on, so async calls must
+    not run on a fresh loop per request (as Flask async views do).
+    """
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='llm-async', daemon=True).start()
+            _async_loop = loop
+    return _async_loop
+
+async def _in_context(context, coroutine_fn, *args):
+    # Tasks start from the loop thread's context; bring over the caller's endpoint label
+    for var, value in context.items():
+        var.set(value)
+    return await coroutine_fn(*args)
+
+def run_async(coroutine_fn, *args):
+    """Run a coroutine function on the shared event loop and wait for its result"""
+    coroutine = _in_context(contextvars.copy_context(), coroutine_fn, *args)
+    return asyncio.run_coroutine_threadsafe(coroutine, get_async_loop()).result()
+
+async def analyze_with_cache_async(email_content, sender_email='', mode=ANALYSIS_MODE, headers=None):
+    """Async variant of analyze_with_cache"""
+    analyzer = EmailAnalyzer(email_content, sender_email, mode)
+    analysis_results, cached, key = lookup_analysis(email_content, sender_email, mode, headers)
+    if analysis_results is not None:
+        return analysis_results, cached
+
+    analysis_results = await analyzer.analyze_email_async()
+    cache_analysis(key, analysis_results)
+    return analysis_results, False
+
+def cache_analysis(key, analysis_results):
+    # Partial or unparseable analyses are worth retrying, so they are not cached
+    if 'priority_analysis' in analysis_results and 'analysis_errors' not in analysis_results:
+        analysis_cache.set(key, analysis_results)
+
+def add_final_priority(analysis_results):
+    """Calculate the final priority score from the priority and authority sections"""
+    if 'priority_analysis' in analysis_results and 'authority_analysis' in analysis_results:
+        final_priority_score = min(
+            analysis_results['priority_analysis']['priority_score'] * 
+            analysis_results['authority_analysis']['priority_multiplier'],
+            100
+        )
+        analysis_results['final_priority_score'] = final_priority_score
+    return analysis_results
+
+def analyze_batch(emails, mode=ANALYSIS_MODE):
+    """
+    Analyze many emails: deduplicate by cache key, serve cache hits, pack short emails
+    into shared calls (single mode only) and run the rest on batch_executor.
+
+    Args:
+        emails (list): dicts with a unique 'id', 'email_content' and optional 'sender_email' and 'headers'
+
+    Returns:
+        dict: input id, as a string -> {'analysis': ..., 'cached': bool} or {'error': ...}
+    """
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    # Results are keyed by id in a JSON object, so 1 and "1" would collide
+    email_ids = [str(email['id']) for email in emails]
+    if len(set(email_ids)) != len(email_ids):
+        raise ValueError("Email ids must be unique")
+
+    # Identical emails share one cache key and are analyzed once
+    unique = OrderedDict()
+    ids_by_key = {}
+    prefiltered = {}
+    for email_id, email in zip(email_ids, emails):
+        analysis_results = prefilter(email['email_content'], email.get('sender_email', ''),
+                                     email.get('headers'), mode)
+        if analysis_results is not None:
+            prefiltered[email_id] = {'analysis': add_final_priority(analysis_results), 'cached': False}
+            continue
+        key = analysis_cache_key(email['email_content'], email.get('sender_email', ''), PROMPT_VERSION, mode)
+        if key not in unique:
+            # Stripped of quoted replies as in /analyze_email, since packed and single results share the cache
+            analyzer = EmailAnalyzer(email['email_content'], email.get('sender_email', ''), mode)
+            unique[key] = (analyzer.email_content, analyzer.sender_email)
+        ids_by_key.setdefault(key, []).append(email_id)
+
+    outcomes = {}
+    pending = []
+    for key in unique:
+        cached = cached_analysis(key)
+        if cached is not None:
+            outcomes[key] = {'analysis': cached, 'cached': True}
+        else:
+            pending.append(key)
+
+    def analyze_one(key):
+        email_content, sender_email = unique[key]
+        analysis_results = EmailAnalyzer(email_content, sender_email, mode, strip_replies=False).analyze_email()
+        cache_analysis(key, analysis_results)
+        return {key: {'analysis': analysis_results, 'cached': False}}
+
+    def analyze_group(keys):
+        packed = EmailAnalyzer.analyze_packed([unique[key] for key in keys])
+        group_outcomes = {}
+        for index, key in enumerate(keys):
+            if index in packed:
+                cache_analysis(key, packed[index])
+                group_outcomes[key] = {'analysis': packed[index], 'cached': False}
+            else:
+                # The model dropped this email from the packed response
+                group_outcomes.update(analyze_one(key))
+        return group_outcomes
+
+    short = []
+    if mode == 'single':
+        short = [key for key in pending if len(unique[key][0]) <= PACK_MAX_CHARS]
+    groups = [short[i:i + PACK_SIZE] for i in range(0, len(short), PACK_SIZE)]
+    # A lone short email is cheaper through the regular single-email prompt
+    singles = [key for key in pending if key not in short] + [g[0] for g in groups if len(g) == 1]
+    groups = [g for g in groups if len(g) > 1]
+
+    futures = {submit_with_context(batch_executor, analyze_group, group): group for group in groups}
+    futures.update({submit_with_context(batch_executor, analyze_one, key): [key] for key in singles})
+    for future, keys in futures.items():
+        try:
+            outcomes.update(future.result())
         except Exception as e:
-            print(f"General parsing error: {str(e)}")
-            return {"meetings": []}
+            for key in keys:
+                outcomes[key] = {'error': str(e)}
+
+    results = prefiltered
+    for key, outcome in outcomes.items():
+        for email_id in ids_by_key[key]:
+            if 'analysis' in outcome:
+                # Each id gets its own copy since the priority score is added in place
+                analysis_results = add_final_priority(copy.deepcopy(outcome['analysis']))
+                results[email_id] = {'analysis': analysis_results, 'cached': outcome['cached']}
+            else:
+                results[email_id] = outcome
+    return results
+
+def options_error(mode, headers):
+    """Message for an unknown analysis mode or malformed headers in a request, or None"""
+    if mode not in ANALYSIS_MODES:
+        return f"Unknown mode: {mode}. Use one of: {', '.join(ANALYSIS_MODES)}"
+    if headers is not None and not isinstance(headers, dict):
+        return 'headers must be an object of header names to values'
+    return None
+
+def analysis_response(analysis_results, cached):
+    # Calculate final priority score
+    add_final_priority(analysis_results)
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'analysis': analysis_results,
+        'cached': cached
+    }
+
+def warmup():
+    """Build the LLM client before the first request, optionally with one real call"""
+    get_llm()
+    if WARMUP_CALL:
+        try:
+            EmailAnalyzer("Warmup: please confirm the meeting tomorrow at 10am.", 'warmup@localhost').analyze_email()
+        except Exception as e:
+            print(f"Warmup call failed: {str(e)}")
+
+def shutdown():
+    """Let in-flight LLM calls finish before the worker exits"""
+    batch_executor.shutdown(wait=True)
+    llm_executor.shutdown(wait=True)
+    if _async_loop is not None:
+        _async_loop.call_soon_threadsafe(_async_loop.stop)
 
 # Create Flask app instance
 app = Flask(__name__)
 CORS(app)
+instrument_flask_app(app, 'email_analysis')
 
 @executive_agent.route('/analyze_email', methods=['POST'])
 def analyze_email():
@@ -161,25 +782,65 @@ def analyze_email():
         
         if not email_content:
             return jsonify({'error': 'No email content provided'}), 400
+        error = options_error(data.get('mode', ANALYSIS_MODE), data.get('headers'))
+        if error:
+            return jsonify({'error': error}), 400
             
-        analyzer = EmailAnalyzer(email_content, sender_email)
-        analysis_results = analyzer.analyze_email()
+        analysis_results, cached = analyze_with_cache(
+            email_content, sender_email, data.get('mode', ANALYSIS_MODE), data.get('headers')
+        )
+        return jsonify(analysis_response(analysis_results, cached))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@executive_agent.route('/analyze_email_async', methods=['POST'])
+def analyze_email_async():
+    try:
+        data = request.get_json()
+        email_content = data.get('email_content')
+        sender_email = data.get('sender_email', '')
+        
+        if not email_content:
+            return jsonify({'error': 'No email content provided'}), 400
+        error = options_error(data.get('mode', ANALYSIS_MODE), data.get('headers'))
+        if error:
+            return jsonify({'error': error}), 400
             
-        # Calculate final priority score
-        if 'priority_analysis' in analysis_results and 'authority_analysis' in analysis_results:
-            final_priority_score = min(
-                analysis_results['priority_analysis']['priority_score'] * 
-                analysis_results['authority_analysis']['priority_multiplier'],
-                100
-            )
-            analysis_results['final_priority_score'] = final_priority_score
+        analysis_results, cached = run_async(
+            analyze_with_cache_async, email_content, sender_email, data.get('mode', ANALYSIS_MODE), data.get('headers')
+        )
+        return jsonify(analysis_response(analysis_results, cached))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@executive_agent.route('/analyze_emails', methods=['POST'])
+def analyze_emails():
+    try:
+        data = request.get_json()
+        emails = data.get('emails')
+        
+        if not emails or not isinstance(emails, list):
+            return jsonify({'error': 'No emails provided'}), 400
+        if len(emails) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} emails per batch'}), 400
+        for email in emails:
+            if not isinstance(email, dict) or 'id' not in email or not email.get('email_content'):
+                return jsonify({'error': 'Each email needs an id and email_content'}), 400
+        if len({str(email['id']) for email in emails}) != len(emails):
+            return jsonify({'error': 'Email ids must be unique'}), 400
+        for email in emails:
+            error = options_error(data.get('mode', ANALYSIS_MODE), email.get('headers'))
+            if error:
+                return jsonify({'error': error}), 400
             
-        response = {
-            'timestamp': datetime.now().isoformat(),
-            'analysis': analysis_results
-        }
+        results = analyze_batch(emails, data.get('mode', ANALYSIS_MODE))
         
-        return jsonify(response)
+        return jsonify({
+            'timestamp': datetime.now().isoformat(),
+            'results': results
+        })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -191,7 +852,21 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     })
 
+@executive_agent.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(analysis_cache.get_stats())
+
+@executive_agent.route('/parse_stats', methods=['GET'])
+def get_parse_stats():
+    return jsonify(parse_stats.get_stats())
+
+@executive_agent.route('/prefilter_stats', methods=['GET'])
+def prefilter_stats():
+    return jsonify(bulk_filter.get_stats())
+
 app.register_blueprint(executive_agent)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5009)
\ No newline at end of file
+    # Development server only; production runs gunicorn -c gunicorn.conf.py app:app
+    warmup()
+    app.run(host='0.0.0.0', port=5009, threaded=True)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import re
+
+# Rough average for English text; good enough for budgeting prompt size
+CHARS_PER_TOKEN = 4
+
+# Lines that introduce the quoted previous message in a reply or forward
+REPLY_MARKERS = [
+    re.compile(r'^On .{0,200}wrote:\s*$'),
+    re.compile(r'^-{2,}\s*Original Message\s*-{2,}\s*$', re.IGNORECASE),
+    re.compile(r'^_{10,}\s*$'),
+]
+# A quoted header block ("From: ..." then "Sent: ..." or "To: ..."); a lone "From:" line is body text
+HEADER_BLOCK_START = re.compile(r'^From: .+$')
+HEADER_LINE = re.compile(r'^(Sent|Date|To|Cc|Subject): ', re.IGNORECASE)
+FORWARD_MARKER = re.compile(r'^-{2,}\s*Forwarded message\s*-{2,}\s*$', re.IGNORECASE)
+
+TRUNCATION_MARKER = "\n\n[... content truncated ...]\n\n"
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _is_reply_marker(line, following):
+    if any(marker.match(line) for marker in REPLY_MARKERS):
+        return True
+    return bool(HEADER_BLOCK_START.match(line) and following and HEADER_LINE.match(following[0].strip()))
+
+
+def strip_quoted_replies(text):
+    """
+    Drop quoted history from a reply: '>' prefixed lines and everything after the
+    first reply marker. Forwarded content is kept since it is the message itself.
+    Returns the original text if stripping would leave nothing.
+    """
+    kept = []
+    in_forward = False
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if FORWARD_MARKER.match(stripped):
+            # The forwarded headers would otherwise look like reply markers
+            in_forward = True
+            kept.append(line)
+            continue
+        if not in_forward and any(k.strip() for k in kept) and _is_reply_marker(stripped, lines[index + 1:index + 2]):
+            break
+        if stripped.startswith('>'):
+            continue
+        kept.append(line)
+    result = '\n'.join(kept).strip()
+    return result or text
+
+
+def truncate_to_budget(text, max_tokens, head_ratio=0.75):
+    """Keep the start and the end of the text within max_tokens; the end often holds sign-offs and dates"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    head = int(max_chars * head_ratio)
+    tail = max_chars - head - len(TRUNCATION_MARKER)
+    return text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail > 0 else '')
+
+
+def split_into_chunks(text, max_tokens):
+    """Split text into chunks of at most max_tokens, preferring paragraph then line boundaries"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in re.split(r'\n\s*\n', text):
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]
+        for piece in pieces:
+            if current and size + len(piece) + 2 > max_chars:
+                chunks.append('\n\n'.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
@@ -0,0 +1,33 @@
+# Production server for the email analysis service:
+#   gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5009)}"
+
+# Requests mostly wait on Gemini, so a few processes with many threads each go furthest
+workers = int(os.getenv('WEB_WORKERS', 4))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 16))
+
+# Long emails can take several LLM round trips
+timeout = int(os.getenv('WEB_TIMEOUT', 180))
+# On SIGTERM workers stop accepting requests and get this long to finish in-flight ones
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+# Not preloaded: the Gemini client is not fork-safe, so each worker imports the app itself
+preload_app = False
+
+
+def post_worker_init(worker):
+    from app import warmup
+    warmup()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown()
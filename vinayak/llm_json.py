@@ -0,0 +1,181 @@
+import json
+import math
+import threading
+
+CLOSERS = {'{': '}', '[': ']'}
+MAX_REPAIR_ATTEMPTS = 20
+# Braces in prose before the JSON ("{name}", "{...}") are skipped, up to this many
+MAX_OBJECT_STARTS = 20
+
+
+class JSONParseError(ValueError):
+    pass
+
+
+def _scan(text, start):
+    """
+    Walk a JSON value starting at text[start] ('{' or '[').
+
+    Returns:
+        tuple: (end, cut_points, in_string) where end is the index after the balanced value
+        or None if the text ends first; cut_points are the indexes of commas outside strings,
+        used to drop a truncated trailing member
+    """
+    stack = []
+    cut_points = []
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(char)
+        elif char in '}]':
+            stack.pop()
+            if not stack:
+                return index + 1, cut_points, False
+        elif char == ',':
+            cut_points.append(index)
+    return None, cut_points, in_string
+
+
+def _close(text, stack):
+    return text + ''.join(CLOSERS[opener] for opener in reversed(stack))
+
+
+def _open_stack(text):
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(char)
+        elif char in '}]' and stack:
+            stack.pop()
+    return stack
+
+
+def _repair(fragment, cut_points, in_string):
+    """Close a truncated JSON value, dropping its incomplete trailing member if needed"""
+    head = fragment + '"' if in_string else fragment
+    candidates = [head.rstrip().rstrip(',')]
+    # Fall back to cutting at earlier commas, most recent first
+    candidates += [fragment[:index] for index in reversed(cut_points)]
+    for candidate in candidates[:MAX_REPAIR_ATTEMPTS]:
+        try:
+            return json.loads(_close(candidate, _open_stack(candidate)))
+        except json.JSONDecodeError:
+            continue
+    raise JSONParseError("Could not repair truncated JSON")
+
+
+def parse_json_object(text):
+    """
+    Extract the first JSON object from LLM output, tolerating code fences,
+    surrounding prose and truncation. A brace that does not start valid JSON
+    is skipped and the scan resumes at the next one.
+
+    Returns:
+        tuple: (data, repaired)
+    """
+    start = text.find('{')
+    if start == -1:
+        raise JSONParseError("No JSON object in response")
+    for _ in range(MAX_OBJECT_STARTS):
+        end, cut_points, in_string = _scan(text, start)
+        try:
+            if end is not None:
+                return json.loads(text[start:end]), False
+            return _repair(text[start:], cut_points, in_string), True
+        except ValueError:
+            start = text.find('{', start + 1)
+            if start == -1:
+                break
+    raise JSONParseError("No valid JSON object in response")
+
+
+def conform(data, schema, defaults=None):
+    """
+    Coerce parsed data to a response schema, filling missing or mistyped fields with defaults.
+
+    Args:
+        schema (dict): Gemini-style schema (OBJECT, ARRAY, STRING, NUMBER, BOOLEAN)
+        defaults (dict): optional nested overrides for non-empty default values
+
+    Returns:
+        tuple: (conformed, fixes) where fixes counts the fields that had to be defaulted
+    """
+    kind = schema.get('type')
+    if kind == 'OBJECT':
+        # A missing (None) value is counted by the caller
+        fixes = int(not isinstance(data, dict) and data is not None)
+        if not isinstance(data, dict):
+            data = {}
+        result = dict(data)
+        defaults = defaults if isinstance(defaults, dict) else {}
+        for name, prop in schema.get('properties', {}).items():
+            if name in data:
+                result[name], prop_fixes = conform(data[name], prop, defaults.get(name))
+            else:
+                result[name], prop_fixes = conform(defaults.get(name), prop, defaults.get(name))
+                prop_fixes += 1
+            fixes += prop_fixes
+        return result, fixes
+    if kind == 'ARRAY':
+        if not isinstance(data, list):
+            return [], int(data is not None)
+        items = [conform(item, schema.get('items', {})) for item in data]
+        return [item for item, _ in items], sum(fixes for _, fixes in items)
+    if kind == 'STRING':
+        if isinstance(data, str):
+            return data, 0
+        return ('' if data is None else str(data)), int(data is not None)
+    if kind == 'NUMBER':
+        if isinstance(data, int) and not isinstance(data, bool):
+            return data, 0
+        try:
+            number = float(data)
+        except (TypeError, ValueError):
+            number = None
+        # NaN and Infinity parse as JSON but are not valid in a JSON response
+        if number is not None and math.isfinite(number) and not isinstance(data, bool):
+            return (data if isinstance(data, float) else number), 0
+        return (defaults if isinstance(defaults, (int, float)) else 0), int(data is not None)
+    if kind == 'BOOLEAN':
+        if isinstance(data, bool):
+            return data, 0
+        return (defaults if isinstance(defaults, bool) else False), int(data is not None)
+    return data, 0
+
+
+class ParseStats:
+    """Thread-safe counters for LLM response parsing outcomes"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'parsed': 0, 'repaired': 0, 'failed': 0, 'schema_fixes': 0}
+
+    def record(self, outcome, schema_fixes=0):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.counts['schema_fixes'] += schema_fixes
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.counts)
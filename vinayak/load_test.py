@@ -0,0 +1,88 @@
+"""
+Load test for the email analysis service.
+
+Run the service against the stubbed LLM, then point this script at it:
+
+    LLM_BACKEND=stub STUB_LATENCY=0.5 gunicorn -c gunicorn.conf.py app:app
+    python load_test.py --requests 500 --concurrency 50
+
+Emails are unique by default so the analysis cache does not hide LLM latency;
+pass --duplicates to measure the cached path instead.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_EMAILS = [
+    "Hi team, can we meet on Thursday at 3pm to review the Q3 roadmap? Please bring your updates.",
+    "Reminder: the vendor contract needs to be signed by Friday. Let me know if you have questions.",
+    "Please prepare the slides for the board meeting next Monday and send them to me by Sunday evening.",
+    "The deployment failed last night. Could you look into the logs and fix the pipeline today?",
+]
+
+
+def build_payload(index, duplicates):
+    content = random.choice(SAMPLE_EMAILS)
+    if not duplicates:
+        content += f"\n\nRef #{index}-{random.random()}"
+    return {'email_content': content, 'sender_email': f"user{index % 20}@example.com"}
+
+
+def send(url, payload, timeout):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5009')
+    parser.add_argument('--endpoint', default='/analyze_email', help='/analyze_email or /analyze_email_async')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--duplicates', action='store_true', help='reuse sample emails verbatim')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/') + args.endpoint
+    payloads = [build_payload(i, args.duplicates) for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda payload: send(url, payload, args.timeout), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, ok in results if ok]
+    errors = len(results) - len(latencies)
+    print(f"Requests:    {len(results)} ({errors} errors) at concurrency {args.concurrency}")
+    print(f"Duration:    {elapsed:.2f}s")
+    print(f"Throughput:  {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"Latency p50: {percentile(latencies, 0.5) * 1000:.0f} ms")
+        print(f"Latency p95: {percentile(latencies, 0.95) * 1000:.0f} ms")
+        print(f"Latency p99: {percentile(latencies, 0.99) * 1000:.0f} ms")
+        print(f"Latency max: {max(latencies) * 1000:.0f} ms (mean {statistics.mean(latencies) * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
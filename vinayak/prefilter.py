@@ -0,0 +1,119 @@
+import re
+import threading
+
+SENDER_PATTERN = re.compile(
+    r'(no-?reply|do-?not-?reply|notifications?|newsletters?|mailer-daemon|marketing|news|digest|alerts?)@',
+    re.IGNORECASE
+)
+
+# Phrases typical of marketing and notification footers, with their weights
+BODY_PHRASES = (
+    ('unsubscribe', 0.2),
+    ('view this email in your browser', 0.2),
+    ('view in browser', 0.15),
+    ('manage your preferences', 0.15),
+    ('update your email preferences', 0.15),
+    ('you are receiving this email because', 0.2),
+    ('this is an automated message', 0.25),
+    ('please do not reply to this email', 0.2),
+)
+
+
+class BulkMailFilter:
+    """Cheap local classifier that recognises newsletters and automated mail before LLM analysis"""
+    def __init__(self, threshold=0.85):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.stats = {'checked': 0, 'skipped': 0, 'llm_calls_saved': 0}
+
+    def classify(self, email_content, sender_email='', headers=None):
+        """
+        Score how likely the email is bulk or automated mail.
+
+        Signals are combined as a noisy-or, so several weak signals add up
+        while no single weak signal is enough on its own.
+
+        Returns:
+            dict: confidence between 0 and 1 and the reasons behind it
+        """
+        headers = {name.lower(): str(value).lower() for name, value in (headers or {}).items()}
+        signals = []
+
+        if 'list-unsubscribe' in headers:
+            signals.append((0.6, 'List-Unsubscribe header present'))
+        if 'list-id' in headers:
+            signals.append((0.4, 'Sent through a mailing list'))
+        if headers.get('precedence') in ('bulk', 'list', 'junk'):
+            signals.append((0.5, f"Precedence: {headers['precedence']}"))
+        if headers.get('auto-submitted', 'no') != 'no':
+            signals.append((0.6, 'Auto-Submitted header present'))
+        if 'x-auto-response-suppress' in headers:
+            signals.append((0.3, 'Auto-response suppression header present'))
+
+        if SENDER_PATTERN.search(sender_email or ''):
+            signals.append((0.5, 'Automated sender address'))
+
+        # Footers sit at the end, so only the tail of long emails is scanned
+        tail = email_content[-4000:].lower()
+        phrase_weight = sum(weight for phrase, weight in BODY_PHRASES if phrase in tail)
+        if phrase_weight:
+            signals.append((min(phrase_weight, 0.5), 'Bulk mail footer phrases'))
+
+        not_bulk = 1.0
+        for weight, _ in signals:
+            not_bulk *= 1 - weight
+        return {
+            'confidence': round(1 - not_bulk, 3),
+            'reasons': [reason for _, reason in signals]
+        }
+
+    def check(self, email_content, sender_email='', headers=None, calls_per_analysis=1):
+        """
+        Return a stand-in analysis for high-confidence bulk mail, or None to run the LLM.
+
+        Args:
+            calls_per_analysis (int): LLM calls the full analysis would have made
+        """
+        result = self.classify(email_content, sender_email, headers)
+        skip = result['confidence'] >= self.threshold
+        with self.lock:
+            self.stats['checked'] += 1
+            if skip:
+                self.stats['skipped'] += 1
+                self.stats['llm_calls_saved'] += calls_per_analysis
+        if not skip:
+            return None
+
+        return {
+            'nlp_analysis': {
+                'key_topics': [],
+                'named_entities': {'people': [], 'organizations': [], 'locations': []},
+                'tone': '',
+                'action_items': [],
+                'important_dates': []
+            },
+            'priority_analysis': {
+                'priority_score': 0,
+                'priority_reasons': ['Bulk or automated mail']
+            },
+            'content_segments': {'tasks': [], 'calendar': [], 'others': []},
+            'spam_analysis': {
+                'spam_score': round(result['confidence'] * 100),
+                'spam_reasons': result['reasons']
+            },
+            'authority_analysis': {
+                'is_internal': False,
+                'authority_level': 'automated',
+                'priority_multiplier': 1.0,
+                'red_flags': []
+            },
+            'calendar_meetings': [],
+            'notion_tasks': [],
+            'prefiltered': True
+        }
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['skip_rate'] = stats['skipped'] / stats['checked'] if stats['checked'] else 0.0
+        return stats
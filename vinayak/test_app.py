@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from common.llm_client import schema_defaults
+
+
+class LoopBoundBackend:
+    """Async backend that, like grpc.aio, only works on the event loop it was first used on"""
+    name = 'loop_bound'
+    model_name = 'loop-bound'
+
+    def __init__(self):
+        self.loop = None
+        self.calls = 0
+
+    def generate(self, prompt, schema=None, timeout=None):
+        return json.dumps(schema_defaults(schema))
+
+    async def agenerate(self, prompt, schema=None, timeout=None):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif loop is not self.loop:
+            raise RuntimeError("Task got Future attached to a different loop")
+        self.calls += 1
+        await asyncio.sleep(0)
+        return json.dumps(schema_defaults(schema))
+
+
+class AnalyzeEmailAsyncTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = LoopBoundBackend()
+        patcher = mock.patch.object(app, 'get_llm', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def post(self, email_content):
+        return self.client.post('/analyze_email_async', json={
+            'email_content': email_content,
+            'sender_email': 'colleague@example.com',
+            'mode': 'single'
+        })
+
+    def test_sequential_requests_share_one_event_loop(self):
+        # Different content so the second request is not answered from the analysis cache
+        first = self.post("Can we meet on Thursday at 3pm to go over the Q3 budget?")
+        second = self.post("Please send me the signed contract before Friday's review.")
+
+        self.assertEqual(first.status_code, 200, first.get_json())
+        self.assertEqual(second.status_code, 200, second.get_json())
+        self.assertFalse(second.get_json()['cached'])
+        self.assertEqual(self.backend.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()